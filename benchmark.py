@@ -0,0 +1,343 @@
+import os
+import sys
+import json
+import time
+import threading
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+from urllib.parse import (
+    urlparse,
+    parse_qs)
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer)
+from moviepy.config import get_setting
+import resolver
+import netcore
+from cache import cache_dir
+from profiles import (
+    PROFILES,
+    get_profile)
+from scheduler import Scheduler
+from downloader import (
+    Downloader,
+    SingleDownload)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ENGINES = ("scheduler", "downloader", "single")
+CHUNK_SIZE = 16 * 1024
+
+
+def fixture_audio(duration: int) -> str:
+    """ a synthetic opus stream of ``duration`` seconds, generated once and reused """
+    path = os.path.join(cache_dir(), f"bench-{duration}s.webm")
+    if not os.path.exists(path):
+        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", "-f", "lavfi",
+               "-i", f"sine=frequency=440:duration={duration}", "-c:a", "libopus", "-b:a", "160k", f"{path}.tmp.webm"]
+        subprocess.run(cmd, check=True)
+        os.replace(f"{path}.tmp.webm", path)
+    return path
+
+
+def playlist_id(number: int) -> str:
+    return f"PLbench{number:06d}"
+
+
+def track_id(playlist: int, track: int) -> str:
+    return f"p{playlist:02d}t{track:07d}"
+
+
+def single_id(number: int) -> str:
+    return f"s{number:010d}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """ playlist pages, metadata and range capable audio shaped by the configured latency, bandwidth, error rate
+    and a cap on concurrent requests past which the origin answers 429 """
+    audio: bytes = b""
+    tracks: int = 10
+    duration: int = 180
+    latency: float = 0.0
+    bandwidth: int = 0
+    error_rate: float = 0.0
+    max_concurrent: int = 0
+    active: int = 0
+    lock: threading.Lock = threading.Lock()
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: dict | None = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        for start in range(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[start:start + CHUNK_SIZE])
+            if self.bandwidth:
+                time.sleep(min(CHUNK_SIZE, len(body) - start) / self.bandwidth)
+
+    def do_GET(self) -> None:
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            over = self.max_concurrent and cls.active > self.max_concurrent
+        try:
+            if over:
+                return self.send_body(429, b"slow down", 'text/plain', {'Retry-After': "1"})
+            self.respond()
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def respond(self) -> None:
+        time.sleep(self.latency)
+        if random.random() < self.error_rate:
+            return self.send_body(503, b"unavailable", 'text/plain')
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        base = f"http://127.0.0.1:{self.server.server_port}"
+        if url.path == "/playlist" and 'list' in query:
+            number = int(query['list'][0][len("PLbench"):])
+            videos = [{'playlistVideoRenderer': {
+                'videoId': track_id(number, track), 'title': {'runs': [{'text': f"Track {track + 1}"}]},
+                'lengthSeconds': str(self.duration), 'isPlayable': True}} for track in range(self.tracks)]
+            data = {'header': {'playlistHeaderRenderer': {'title': {'simpleText': f"Album {number}"},
+                                                          'ownerText': {'runs': [{'text': "Bench Artist"}]}}},
+                    'contents': videos}
+            page = f"<html><head><title>Album {number}</title></head><script>var ytInitialData = {json.dumps(data)};</script></html>"
+            return self.send_body(200, page.encode(), 'text/html')
+        if url.path == "/watch" and 'v' in query:
+            return self.send_body(200, f"<html><title>{query['v'][0]} - YouTube</title></html>".encode(), 'text/html')
+        if url.path.startswith("/meta/"):
+            video_id = url.path[len("/meta/"):]
+            metadata = {'title': f"Track {video_id}", 'author': "Bench Artist", 'duration': self.duration, 'streams': [{
+                'itag': 251, 'url': f"{base}/audio/{video_id}.webm", 'abr': "160kbps", 'audio_codec': "opus",
+                'filesize': len(self.audio), 'default_filename': f"{video_id}.webm"}]}
+            return self.send_body(200, json.dumps(metadata).encode(), 'application/json')
+        if url.path.startswith("/audio/"):
+            byte_range = self.headers.get('Range', '')
+            if byte_range.startswith("bytes="):
+                start, _, end = byte_range[len("bytes="):].partition("-")
+                start, end = int(start), int(end) if end else len(self.audio) - 1
+                return self.send_body(206, self.audio[start:end + 1], 'audio/webm',
+                                      {'Content-Range': f"bytes {start}-{end}/{len(self.audio)}"})
+            return self.send_body(200, self.audio, 'audio/webm')
+        self.send_body(404, b"not found", 'text/plain')
+
+
+def serve_stand_in(connection, options: dict) -> None:
+    with open(options['audio'], 'rb') as f:
+        StandInHandler.audio = f.read()
+    for key in ('tracks', 'duration', 'latency', 'bandwidth', 'error_rate',
+                'max_concurrent'):
+        setattr(StandInHandler, key, options[key])
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    connection.send(server.server_port)
+    server.serve_forever()
+
+
+class StandIn:
+    """ resolve metadata from the stand-in server and log every finished conversion """
+    base: str = ""
+    log: str = ""
+
+    def fetch_metadata(self, video_url: str) -> dict:
+        video_id = video_url.split("v=")[1].split("&")[0]
+        response = netcore.shared().get(f"{self.base}/meta/{video_id}", timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+    def finished_track(self) -> None:
+        with open(self.log, 'a') as f:
+            f.write(f"{time.time()}\n")
+
+    def ffmpeg_extract_audio(self, *args, **kwargs) -> None:
+        super().ffmpeg_extract_audio(*args, **kwargs)
+        self.finished_track()
+
+    def ffmpeg_stream_audio(self, *args, **kwargs) -> None:
+        super().ffmpeg_stream_audio(*args, **kwargs)
+        self.finished_track()
+
+
+class BenchScheduler(StandIn, Scheduler):
+    pass
+
+
+class BenchDownloader(StandIn, Downloader):
+    pass
+
+
+class BenchSingleDownload(StandIn, SingleDownload):
+    pass
+
+
+def peak_rss() -> dict:
+    """ peak resident set in MB for this process and its largest reaped child """
+    if resource is None:
+        return {'self': None, 'children': None}
+    # ru_maxrss is in kilobytes on linux and bytes on macos
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def run_engine(engine: str, base: str, options: dict, results) -> None:
+    """ one engine against the stand-in, in its own process so rss and cpu are not shared with other runs """
+    resolver.PLAYLIST_URL = f"{base}/playlist?list={{}}"
+    resolver.WATCH_URL = f"{base}/watch?v={{}}"
+    work = tempfile.mkdtemp(prefix=f"ytmusic-bench-{engine}-")
+    output = os.path.join(work, "library")
+    os.makedirs(output)
+    playlists = [{'id': playlist_id(number), 'type': "playlist"} for number in range(options['playlists'])]
+    singles = [{'id': single_id(number), 'type': "single"} for number in range(options['singles'])]
+    profile = get_profile(options['profile'])
+    if engine == "scheduler":
+        runner = BenchScheduler(output, fetch_workers=options['fetch_workers'], transcode_workers=options['transcode_workers'],
+                                stream=options['stream'], profile=profile, connections=options['connections'])
+    elif engine == "downloader":
+        runner = BenchDownloader(stream=options['stream'], profile=profile, connections=options['connections'])
+    else:
+        runner = BenchSingleDownload(stream=options['stream'], profile=profile, connections=options['connections'])
+    runner.base = base
+    runner.log = os.path.join(work, "finished.log")
+    cpu = os.times()
+    start = time.time()
+    try:
+        if engine == "scheduler":
+            runner.run(playlists + singles)
+        elif engine == "downloader":
+            # Downloader.download only takes playlists
+            runner.download(playlists, output)
+        else:
+            runner.download(singles, output)
+        error = None
+    except Exception as e:
+        error = str(e)
+    elapsed = time.time() - start
+    after = os.times()
+    finished: list = []
+    if os.path.exists(runner.log):
+        with open(runner.log) as f:
+            finished = sorted(float(line) for line in f if line.strip())
+    expected = (options['playlists'] * options['tracks'] if engine != "single" else 0) + \
+        (options['singles'] if engine != "downloader" else 0)
+    results.put({
+        'engine': engine,
+        'tracks': len(finished),
+        'expected': expected,
+        'seconds': round(elapsed, 3),
+        'tracks_per_minute': round(len(finished) / elapsed * 60, 2) if elapsed else 0,
+        'time_to_first_track': round(finished[0] - start, 3) if finished else None,
+        'cpu': {
+            'self': round(after.user + after.system - cpu.user - cpu.system, 3),
+            'children': round(after.children_user + after.children_system - cpu.children_user - cpu.children_system, 3),
+        },
+        'peak_rss_mb': peak_rss(),
+        'stages': {stage: {'count': value['count'], 'seconds': value['sum']}
+                   for stage, value in runner.metrics.to_dict()['stages'].items()},
+        'error': error,
+    })
+    if not options['keep']:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+def revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous(path: str, scenario: dict, engine: str) -> dict | None:
+    """ the last stored result for the same scenario and engine """
+    if not os.path.exists(path):
+        return None
+    match = None
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('scenario') == scenario and entry.get('engine') == engine:
+                match = entry
+    return match
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="ytmusic-dl-bench", description="Measure download throughput against a local stand-in.")
+    parser.add_argument("--engine", action="append", choices=ENGINES, help="engines to run, all by default")
+    parser.add_argument("--playlists", type=int, default=2)
+    parser.add_argument("--tracks", type=int, default=10, help="tracks per playlist")
+    parser.add_argument("--singles", type=int, default=5)
+    parser.add_argument("--duration", type=int, default=180, help="seconds of audio per track")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added before every response")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes per second per connection, 0 for unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                        help="requests the origin serves at once before answering 429, 0 for no cap")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mp3")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--fetch-workers", type=int, default=10)
+    parser.add_argument("--transcode-workers", type=int, default=max((os.cpu_count() or 2) - 1, 1))
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--results", default=os.path.join(cache_dir(), "benchmarks.jsonl"), help="where runs are appended")
+    parser.add_argument("--keep", action="store_true", help="keep the downloaded files")
+    return parser
+
+
+def main(argv: list | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    scenario = {key: getattr(args, key) for key in ('playlists', 'tracks', 'singles', 'duration', 'latency', 'bandwidth',
+                                                    'error_rate', 'max_concurrent', 'profile', 'stream', 'fetch_workers',
+                                                    'transcode_workers', 'connections')}
+    options = dict(scenario, audio=fixture_audio(args.duration), keep=args.keep)
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    server = context.Process(target=serve_stand_in, args=(sender, options), daemon=True)
+    server.start()
+    base = f"http://127.0.0.1:{receiver.recv()}"
+    failed = False
+    try:
+        for engine in args.engine or ENGINES:
+            results = context.Queue()
+            process = context.Process(target=run_engine, args=(engine, base, options, results))
+            process.start()
+            result = results.get()
+            process.join()
+            result.update(time=time.time(), revision=revision(), scenario=scenario)
+            before = previous(args.results, scenario, engine)
+            with open(args.results, 'a') as f:
+                f.write(json.dumps(result) + "\n")
+            failed = failed or result['error'] is not None or result['tracks'] < result['expected']
+            line = f"{engine:<10} {result['tracks']}/{result['expected']} tracks in {result['seconds']}s, " \
+                   f"{result['tracks_per_minute']} tracks/min, first after {result['time_to_first_track']}s, " \
+                   f"cpu {result['cpu']['self']}s + {result['cpu']['children']}s children, " \
+                   f"peak rss {result['peak_rss_mb']['self']} MB"
+            if before is not None and before['tracks_per_minute']:
+                change = (result['tracks_per_minute'] - before['tracks_per_minute']) / before['tracks_per_minute']
+                line += f" ({change:+.1%} vs {before.get('revision') or 'last run'})"
+            print(line, flush=True)
+    finally:
+        server.terminate()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
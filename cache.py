@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import (
+    urlparse,
+    parse_qs)
+
+DEFAULT_TTL = 5 * 60 * 60
+DEFAULT_MAX_ENTRIES = 20000
+# a manifest is dropped this long before its signed urls lapse so no transfer starts on one about to expire
+EXPIRY_MARGIN = 10 * 60
+# what a signed stream url answers once the origin no longer honours it
+EXPIRED_CODES = {403, 410}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+def cache_dir() -> str:
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA', os.path.expanduser('~'))
+    else:
+        base = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    directory = os.path.join(base, 'ytmusic-dl')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def url_expiry(url: str) -> float | None:
+    """ signed stream urls carry their own expiry, a cached manifest must not outlive it """
+    expire = parse_qs(urlparse(url).query).get('expire')
+    if expire and expire[0].isdigit():
+        return float(expire[0]) - EXPIRY_MARGIN
+    return None
+
+
+class MetadataCache:
+    """ disk backed cache of resolved video metadata and stream manifests with a ttl and an lru cap """
+    def __init__(self, path: str | None = None, ttl: int = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.path: str = path or os.path.join(cache_dir(), 'metadata.sqlite3')
+        self.ttl: int = ttl
+        self.max_entries: int = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self.lock: threading.Lock = threading.Lock()
+        self.connect()
+
+    def connect(self) -> None:
+        self.db: sqlite3.Connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def get(self, key: str, *fields: str) -> dict | None:
+        """ the live entry for ``key``, only counted as a hit and returned when it has every one of ``fields`` """
+        now = time.time()
+        with self.lock:
+            row = self.db.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            value = json.loads(row[0]) if row is not None and row[1] >= now else None
+            if value is None or not all(value.get(field) for field in fields):
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: dict, expires: float | None = None) -> None:
+        now = time.time()
+        expires = min(expires or now + self.ttl, now + self.ttl)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, json.dumps(value), expires, now))
+            self.db.execute(
+                "DELETE FROM entries WHERE expires < ? OR key IN "
+                "(SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (now, self.max_entries))
+
+    def update(self, key: str, **fields) -> None:
+        """ merge ``fields`` into a live entry without changing its expiry, an expired one is started over """
+        with self.lock:
+            row = self.db.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            # keeping the old expiry here would have put() sweep the row straight away, fields and all
+            self.put(key, fields)
+            return
+        value = json.loads(row[0])
+        value.update(fields)
+        self.put(key, value, row[1])
+
+    def stats(self) -> dict:
+        with self.lock:
+            size = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': size}
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,131 @@
+import os
+import sqlite3
+import logging
+import mutagen
+from journal import (
+    STATE_DIR,
+    database_path)
+from profiles import OUTPUT_EXTENSIONS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    subdirs TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    duration REAL,
+    bitrate INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+"""
+
+
+def read_audio_info(path: str) -> tuple:
+    """ duration in seconds and bitrate in bits per second, None when the file cannot be parsed """
+    try:
+        audio = mutagen.File(path)
+    except Exception:
+        return None, None
+    if audio is None or audio.info is None:
+        return None, None
+    return getattr(audio.info, 'length', None), getattr(audio.info, 'bitrate', None)
+
+
+class Catalog:
+    """ persistent index of the audio files under a library root, rescanning only directories whose mtime moved """
+    def __init__(self, root: str, path: str | None = None) -> None:
+        self.root: str = os.path.abspath(root)
+        self.db: sqlite3.Connection = sqlite3.connect(path or database_path(root, "catalog.sqlite3"))
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def absolute(self, relative: str) -> str:
+        return os.path.join(self.root, relative) if relative else self.root
+
+    def scan(self) -> int:
+        """ bring the catalog in line with the disk, returns how many directories had to be listed """
+        known: dict = {row['path']: (row['mtime'], row['subdirs']) for row in self.db.execute("SELECT * FROM dirs")}
+        seen: set = set()
+        stack: list = [""]
+        rescanned: int = 0
+        while stack:
+            relative = stack.pop()
+            seen.add(relative)
+            try:
+                mtime = os.stat(self.absolute(relative)).st_mtime
+            except OSError:
+                continue
+            if relative in known and known[relative][0] == mtime:
+                stack.extend(name for name in known[relative][1].split('\n') if name)
+                continue
+            stack.extend(self.scan_directory(relative, mtime))
+            rescanned += 1
+        gone = [path for path in known if path not in seen]
+        with self.db:
+            for path in gone:
+                self.db.execute("DELETE FROM dirs WHERE path = ?", (path,))
+                self.db.execute("DELETE FROM files WHERE dir = ?", (path,))
+        return rescanned
+
+    def scan_directory(self, relative: str, mtime: float) -> list:
+        """ relist one directory, reusing stored metadata for files that did not change """
+        existing: dict = {row['path']: row for row in self.db.execute("SELECT * FROM files WHERE dir = ?", (relative,))}
+        subdirs: list = []
+        rows: list = []
+        try:
+            entries = list(os.scandir(self.absolute(relative)))
+        except OSError as e:
+            logging.exception(f"Could not list {self.absolute(relative)}: {e}")
+            return []
+        for entry in entries:
+            if entry.name.startswith('.') or entry.name == STATE_DIR:
+                continue
+            path = os.path.join(relative, entry.name) if relative else entry.name
+            try:
+                if entry.is_dir():
+                    subdirs.append(path)
+                    continue
+                if not entry.name.lower().endswith(OUTPUT_EXTENSIONS):
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            old = existing.pop(path, None)
+            if old is not None and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime:
+                continue
+            duration, bitrate = read_audio_info(entry.path)
+            rows.append((path, relative, entry.name, stat.st_size, stat.st_mtime, duration, bitrate))
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in existing])
+            self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (relative, mtime, '\n'.join(subdirs)))
+        return subdirs
+
+    def folders(self) -> list:
+        """ folders directly under the root """
+        row = self.db.execute("SELECT subdirs FROM dirs WHERE path = ''").fetchone()
+        return sorted((name for name in row['subdirs'].split('\n') if name), key=str.lower) if row is not None else []
+
+    def top_level(self) -> list:
+        """ album folders and loose tracks directly under the root """
+        files = [row['name'] for row in self.db.execute("SELECT name FROM files WHERE dir = '' ORDER BY name")]
+        return self.folders() + files
+
+    def tracks(self) -> list:
+        return self.db.execute("SELECT * FROM files ORDER BY path").fetchall()
+
+    def counts(self) -> tuple:
+        """ albums are folders holding at least one track """
+        albums = self.db.execute("SELECT COUNT(DISTINCT dir) FROM files WHERE dir != ''").fetchone()[0]
+        tracks = self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return albums, tracks
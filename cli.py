@@ -0,0 +1,133 @@
+import sys
+import json
+import time
+import argparse
+from scheduler import (
+    Scheduler,
+    DEFAULT_FETCH_WORKERS,
+    DEFAULT_TRANSCODE_WORKERS)
+from resolver import parse_items
+from profiles import (
+    PROFILES,
+    get_profile)
+from journal import Journal
+from progress import ProgressTracker
+from tempfiles import sweep_orphans
+from cache import MetadataCache
+from report import DEFAULT_RETRIES
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+def emit(event: str, **fields) -> None:
+    """ one json object per line on stdout """
+    print(json.dumps({'event': event, 'time': round(time.time(), 3), **fields}), flush=True)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="ytmusic-dl", description="Download tracks and playlists without the GUI.")
+    parser.add_argument("items", nargs="*", help="video or playlist ids or urls")
+    parser.add_argument("-f", "--batch-file", action="append", default=[], help="file with one id or url per line, - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="library root to download into")
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS)
+    parser.add_argument("--transcode-workers", type=int, default=DEFAULT_TRANSCODE_WORKERS)
+    parser.add_argument("--connections", type=int, default=4, help="range connections per stream")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mp3")
+    parser.add_argument("--bitrate", type=int, default=0, help="kbit/s, overrides the profile default")
+    parser.add_argument("--stream", action="store_true", help="pipe audio into ffmpeg without a source file")
+    parser.add_argument("--no-journal", action="store_true", help="do not record or resume progress")
+    parser.add_argument("--metrics", action="append", default=[], metavar="PATH",
+                        help="write stage timings and counters, json for .json paths and prometheus text otherwise")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help="rounds of retrying only the tracks that failed, 0 turns them off")
+    parser.add_argument("--sync", action="store_true",
+                        help="only download playlist tracks added since the last sync of that playlist")
+    parser.add_argument("--prune", action="store_true",
+                        help="with --sync, also delete the files of tracks that left the playlist")
+    parser.add_argument("--report", metavar="PATH", help="write a json report of the job listing the tracks that failed")
+    parser.add_argument("--sweep-library", action="store_true",
+                        help="delete temp files left by crashed runs in every folder of the library, "
+                             "not just the ones this run touches")
+    parser.add_argument("--progress-interval", type=float, default=1.0,
+                        help="seconds between progress events, 0 turns them off")
+    return parser
+
+
+def collect_items(args) -> tuple:
+    text: list = []
+    for batch in args.batch_file:
+        if batch == "-":
+            text.append(sys.stdin.read())
+        else:
+            with open(batch, encoding='utf-8', errors='replace') as f:
+                text.append(f.read())
+    text.extend(args.items)
+    return parse_items("\n".join(text))
+
+
+def main(argv: list | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        items, invalid = collect_items(args)
+    except OSError as e:
+        emit("error", message=str(e))
+        return EXIT_USAGE
+    for line in invalid:
+        emit("invalid", input=line)
+    if not items:
+        emit("error", message="nothing to download")
+        return EXIT_USAGE
+
+    def job_done(job, result: tuple, done: int, total: int) -> None:
+        emit("track", id=job.video_id, item=job.item_id, ok=result[1], message=result[2], done=done, total=total)
+
+    def transfer(snapshot: dict) -> None:
+        emit("progress", **snapshot)
+
+    journal: Journal | None = None if args.no_journal else Journal.for_library(args.output)
+    progress: ProgressTracker | None = ProgressTracker(transfer, args.progress_interval) if args.progress_interval > 0 else None
+    cache: MetadataCache = MetadataCache()
+    scheduler: Scheduler = Scheduler(args.output, fetch_workers=args.fetch_workers, transcode_workers=args.transcode_workers,
+                                     stream=args.stream, profile=get_profile(args.profile, args.bitrate),
+                                     connections=args.connections, cache=cache, journal=journal, on_job_done=job_done,
+                                     progress=progress, retries=args.retries, sync=args.sync or args.prune,
+                                     prune=args.prune)
+    # the scheduler sweeps the folders it writes to, a full walk is slow on a network share
+    removed: int = sweep_orphans(args.output) if args.sweep_library else 0
+    if removed:
+        emit("swept", removed=removed)
+    emit("start", items=len(items), output=args.output)
+    try:
+        results: list = scheduler.run(items)
+    except KeyboardInterrupt:
+        emit("interrupted")
+        return 130
+    finally:
+        if journal is not None:
+            journal.close()
+    for path in args.metrics:
+        try:
+            scheduler.metrics.write(path)
+        except OSError as e:
+            emit("error", message=f"Could not write metrics to {path}: {e}")
+    report = scheduler.report
+    if args.report:
+        try:
+            report.write(args.report)
+        except OSError as e:
+            emit("error", message=f"Could not write the report to {args.report}: {e}")
+    for synced in report.synced:
+        emit("synced", **synced)
+    failures: list = report.failures
+    for failure in failures:
+        emit("failed", **failure)
+    emit("summary", tracks=len(results), failed=len(failures), retried=report.retried, cache=cache.stats(),
+         browser_launches=int(scheduler.metrics.total('browser_launches')))
+    cache.close()
+    return EXIT_FAILED if failures or invalid else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
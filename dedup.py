@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import threading
+from journal import database_path
+
+# linux ioctl that shares extents between two files on btrfs, xfs and similar
+FICLONE = 0x40049409
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL DEFAULT '',
+    size INTEGER,
+    confirmed INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_video ON files (video_id, profile);
+"""
+
+
+def reflink(source: str, dest: str) -> None:
+    if not sys.platform.startswith('linux'):
+        raise OSError("reflinks are only attempted on linux")
+    import fcntl
+    with open(source, 'rb') as src, open(dest, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(dest)
+            raise
+
+
+def link_file(source: str, dest: str) -> str:
+    """ place ``source`` at ``dest`` without going over the network, returns how: hardlink, reflink or copy """
+    try:
+        os.link(source, dest)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        reflink(source, dest)
+        return "reflink"
+    except OSError:
+        pass
+    shutil.copy2(source, dest)
+    return "copy"
+
+
+class FileIndex:
+    """ library wide map from video id and output profile to the files already converted for it """
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.lock: threading.Lock = threading.Lock()
+        self.connect()
+
+    @classmethod
+    def for_library(cls, root: str) -> "FileIndex":
+        return cls(database_path(root, "files.sqlite3"))
+
+    def connect(self) -> None:
+        self.db: sqlite3.Connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+    def expect(self, video_id: str, profile: str, path: str, title: str, author: str = "") -> None:
+        """ note the file a conversion is about to write, it only counts once confirmed """
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO files (path, video_id, profile, title, author, confirmed, updated) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?)",
+                (os.path.abspath(path), video_id, profile, title, author, time.time()))
+
+    def confirm(self, path: str) -> None:
+        path = os.path.abspath(path)
+        with self.lock:
+            self.db.execute("UPDATE files SET confirmed = 1, size = ?, updated = ? WHERE path = ?",
+                            (os.path.getsize(path), time.time(), path))
+
+    def add(self, video_id: str, profile: str, path: str, title: str, author: str = "") -> None:
+        self.expect(video_id, profile, path, title, author)
+        self.confirm(path)
+
+    def find(self, video_id: str, profile: str):
+        """ a confirmed file for the track that is still on disk unchanged, dropping entries that went stale """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM files WHERE video_id = ? AND profile = ? AND confirmed = 1 ORDER BY updated DESC",
+                (video_id, profile)).fetchall()
+        for row in rows:
+            try:
+                if os.path.getsize(row['path']) == row['size']:
+                    return row
+            except OSError:
+                pass
+            with self.lock:
+                self.db.execute("DELETE FROM files WHERE path = ?", (row['path'],))
+        return None
+
+    def locate(self, video_id: str, profile: str, directory: str) -> str | None:
+        """ the confirmed file for the track inside ``directory``, ignoring copies linked into other folders """
+        directory = os.path.abspath(directory)
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT path FROM files WHERE video_id = ? AND profile = ? AND confirmed = 1 ORDER BY updated DESC",
+                (video_id, profile)).fetchall()
+        for row in rows:
+            if os.path.dirname(row['path']) == directory and os.path.exists(row['path']):
+                return row['path']
+        return None
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
@@ -1,25 +1,347 @@
 import os
 import re
+import time
 import logging
 import contextlib
 import subprocess
-import multiprocessing
 from pytube import YouTube
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from playwright.sync_api import sync_playwright
 from moviepy.config import get_setting
 from moviepy.tools import subprocess_call
+from resolver import (
+    PlaylistResolver,
+    item_url,
+)
+from segmented import SegmentedDownload
+from netcore import (
+    shared,
+    route_pytube)
+from progress import ProgressTracker
+from metrics import Metrics
+from dedup import (
+    FileIndex,
+    link_file)
+from sync import Manifest
+from report import (
+    JobReport,
+    DEFAULT_RETRIES)
+from throttle import (
+    MAX_ATTEMPTS,
+    ConcurrencyController,
+    is_throttled,
+    status_of,
+    retry_after,
+    backoff)
+from tempfiles import (
+    source_path,
+    temp_output,
+    discard)
+from cache import (
+    MetadataCache,
+    EXPIRED_CODES,
+    url_expiry)
+from profiles import (
+    DEFAULT_PROFILE,
+    OutputProfile)
+
+# tracks of an album fetched and converted at once, the transfers share the netcore loop and each
+# conversion is its own ffmpeg process, so threads keep every cpu busy without a process per track
+DEFAULT_WORKERS = 10
+
+# pytube opens a fresh urlopen per request otherwise, with its own dns lookup and tls handshake
+route_pytube()
+
 
 class Base:
-    def __init__(self) -> None:
+    def __init__(self, stream: bool = False, profile: OutputProfile | None = None, connections: int = 4,
+                 cache: MetadataCache | None = None, progress: ProgressTracker | None = None,
+                 metrics: Metrics | None = None) -> None:
         logging.basicConfig(filename='error.log', level=logging.ERROR)
+        self.stream: bool = stream
+        self.profile: OutputProfile = profile or DEFAULT_PROFILE
+        self.connections: int = connections
+        self.cache: MetadataCache | None = cache
+        self.progress: ProgressTracker | None = progress
+        self.metrics: Metrics = metrics or Metrics()
+        self.index: FileIndex | None = None
+        self.limiter: ConcurrencyController | None = None
+        self.retries: int = DEFAULT_RETRIES
+        self.report: JobReport = JobReport()
+
+    def ffmpeg_extract_audio(self, inputfile: str, output: str, source_codec: str | None = None, track: str | None = None):
+        """ extract the sound from a video file and save it in ``output``, remuxing when the codec already fits """
+        tmp = temp_output(output)
+        try:
+            with self.metrics.timer("transcode"):
+                self._ffmpeg_extract_audio(inputfile, tmp, source_codec, track)
+            os.replace(tmp, output)
+        except Exception:
+            discard(tmp)
+            raise
+
+    def _ffmpeg_extract_audio(self, inputfile: str, output: str, source_codec: str | None, track: str | None):
+        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-i", inputfile] + self.profile.ffmpeg_args(source_codec) + [output]
+        if self.progress is None or track is None:
+            subprocess_call(cmd, logger=None)
+            return
+        # -progress writes key=value lines, out_time_us is how far into the track the encoder is
+        cmd[1:1] = ["-loglevel", "error", "-nostats", "-progress", "pipe:1"]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        for line in proc.stdout:
+            key, _, value = line.partition(b"=")
+            if key == b"out_time_us" and value.strip().isdigit():
+                self.progress.transcoded(track, int(value) / 1000000)
+        error = proc.stderr.read().decode(errors='replace')
+        if proc.wait() != 0:
+            raise IOError(f"ffmpeg failed on {inputfile}: {error.strip()}")
+
+    def ffmpeg_stream_audio(self, url: str, output: str, source_codec: str | None = None, chunk_size=1024*1024,
+                            track: str | None = None):
+        """ pipe the http body at ``url`` into ffmpeg so only ``output`` is written to disk """
+        tmp = temp_output(output)
+        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error", "-i", "pipe:0"] + \
+            self.profile.ffmpeg_args(source_codec) + [tmp]
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        received = 0
+        core = shared()
+        try:
+            with core.stream(url, timeout=30, media=True) as response:
+                response.raise_for_status()
+                for chunk in core.chunks(response, chunk_size):
+                    proc.stdin.write(chunk)
+                    received += len(chunk)
+                    if self.progress is not None and track is not None:
+                        self.progress.transferred(track, received)
+            proc.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg exited early, its return code below says why
+            pass
+        except Exception:
+            self.metrics.add('bytes', received)
+            proc.kill()
+            proc.wait()
+            discard(tmp)
+            raise
+        self.metrics.add('bytes', received)
+        error = proc.stderr.read().decode(errors='replace')
+        if proc.wait() != 0:
+            discard(tmp)
+            raise IOError(f"ffmpeg failed on streamed input: {error.strip()}")
+        os.replace(tmp, output)
+
+    def video_id(self, video_url: str) -> str:
+        return video_url.split("v=")[1].split("&")[0]
+
+    def output_name(self, title: str, author: str, with_artist: bool = False) -> str:
+        dest_filename = title.replace('?','').replace('/', '').replace(',','').replace('*','').replace('"','')
+        if with_artist:
+            dest_filename = f"{author} - {dest_filename}"
+        return dest_filename
+
+    def video_metadata(self, video_url: str) -> dict:
+        """ title, author, duration and the audio stream manifest with the best stream first """
+        video_id = self.video_id(video_url)
+        if self.cache is not None:
+            metadata = self.cache.get(video_id, 'streams')
+            if metadata is not None:
+                self.metrics.add('cache', result="hit")
+                return metadata
+            self.metrics.add('cache', result="miss")
+        with self.metrics.timer("resolve"):
+            metadata = self.fetch_metadata(video_url)
+        if self.cache is not None:
+            self.cache.put(video_id, metadata, url_expiry(metadata['streams'][0]['url']))
+        return metadata
+
+    def forget_streams(self, video_url: str, error: Exception) -> None:
+        """ a stream url the origin refused is not served from the cache again, the title stays """
+        if self.cache is not None and status_of(error) in EXPIRED_CODES:
+            self.cache.update(self.video_id(video_url), streams=None)
+            self.metrics.add('cache', result="expired")
+
+    def fetch_metadata(self, video_url: str) -> dict:
+        yt = YouTube(video_url)
+        streams = yt.streams.filter(only_audio=True).order_by('abr').desc()
+        if not streams:
+            raise ValueError(f"No audio streams for {video_url}")
+        return {
+            'title': yt.title,
+            'author': yt.vid_info['videoDetails']['author'],
+            'duration': yt.length,
+            'streams': [{
+                'itag': stream.itag,
+                'url': stream.url,
+                'abr': stream.abr,
+                'audio_codec': stream.audio_codec,
+                'filesize': getattr(stream, '_filesize', 0) or None,
+                'default_filename': stream.default_filename,
+            } for stream in streams],
+        }
+
+    def resolve_audio(self, video_url: str, output_path: str, with_artist: bool = False) -> tuple:
+        """ pick the best audio stream, returns it with the output path it becomes and the title """
+        metadata = self.video_metadata(video_url)
+        video_stream = metadata['streams'][0]
+        dest_filename = self.output_name(metadata['title'], metadata['author'], with_artist)
+        extension = self.profile.extension_for(video_stream['audio_codec'])
+        dest = f"{output_path}/{dest_filename}.{extension}"
+        if self.index is not None:
+            self.index.expect(self.video_id(video_url), self.profile.key, dest, metadata['title'], metadata['author'])
+        if self.progress is not None:
+            self.progress.begin(video_url, metadata['title'], video_stream['filesize'], metadata['duration'])
+        return video_stream, dest, metadata['title']
+
+    def link_existing(self, video_url: str, output_path: str, with_artist: bool = False) -> tuple | None:
+        """ reuse a conversion of the same track elsewhere in the library, returns the output path and the title """
+        if self.index is None:
+            return None
+        entry = self.index.find(self.video_id(video_url), self.profile.key)
+        if entry is None:
+            return None
+        extension = os.path.splitext(entry['path'])[1]
+        dest = f"{output_path}/{self.output_name(entry['title'], entry['author'], with_artist)}{extension}"
+        if not os.path.exists(dest):
+            tmp = temp_output(dest)
+            method = link_file(entry['path'], tmp)
+            os.replace(tmp, dest)
+            self.metrics.add('linked', method=method)
+            self.index.add(self.video_id(video_url), self.profile.key, dest, entry['title'], entry['author'])
+        return dest, entry['title']
 
-    def ffmpeg_extract_audio(self, inputfile: str, output: str, bitrate=3000, fps=44100):
-        """ extract the sound from a video file and save it in ``output`` """
-        cmd = [get_setting("FFMPEG_BINARY"), "-y", "-i", inputfile, "-ab", "%dk"%bitrate,
-            "-ar", "%d"%fps, output]
-        subprocess_call(cmd, logger=None)
+    def remember(self, dest: str) -> None:
+        """ mark a finished conversion as reusable by later jobs """
+        if self.index is not None:
+            self.index.confirm(dest)
+
+    def fetch_audio(self, video_url: str, output_path: str, with_artist: bool = False, source: str | None = None,
+                    on_source=None) -> tuple:
+        """ download the best audio stream, returns the source file, its output path, the title and the codec,
+            ``source`` resumes a partial download and ``on_source`` hears the path before any byte is written """
+        video_stream, dest, title = self.resolve_audio(video_url, output_path, with_artist)
+        if source is None or os.path.splitext(source)[1] != os.path.splitext(video_stream['default_filename'])[1]:
+            source = source_path(output_path, self.video_id(video_url), video_stream['default_filename'])
+        if on_source is not None:
+            on_source(source)
+        on_progress = None
+        if self.progress is not None:
+            on_progress = lambda received: self.progress.transferred(video_url, received)
+        download = SegmentedDownload(video_stream['url'], source, self.connections, video_stream['filesize'],
+                                     on_progress=on_progress)
+        try:
+            with self.metrics.timer("transfer"):
+                download.run()
+        except Exception as e:
+            self.forget_streams(video_url, e)
+            raise
+        finally:
+            self.metrics.add('bytes', download.received)
+            if download.fallbacks:
+                self.metrics.add('retries', download.fallbacks, reason="range")
+        return source, dest, title, video_stream['audio_codec']
+
+    def stream_audio(self, video_url: str, output_path: str, with_artist: bool = False) -> tuple:
+        """ download and convert in one pass without a source file, returns the output path and the title """
+        video_stream, dest, title = self.resolve_audio(video_url, output_path, with_artist)
+        try:
+            with self.metrics.timer("stream"):
+                self.ffmpeg_stream_audio(video_stream['url'], dest, video_stream['audio_codec'], track=video_url)
+        except Exception as e:
+            self.forget_streams(video_url, e)
+            raise
+        return dest, title
+
+    def retrying(self, action, size_of=None):
+        """ run a network step under the concurrency limit, backing off and trying again while the origin throttles,
+            the whole step runs again on a retry, a segmented transfer picks up from its saved ranges """
+        for attempt in range(MAX_ATTEMPTS):
+            slot = self.limiter.slot() if self.limiter is not None else contextlib.nullcontext()
+            with slot:
+                started = time.monotonic()
+                try:
+                    result = action()
+                except Exception as e:
+                    if not is_throttled(e) or attempt == MAX_ATTEMPTS - 1:
+                        raise
+                    if self.limiter is not None:
+                        self.limiter.throttled(started)
+                    self.metrics.add('retries', reason="throttled")
+                    delay = backoff(attempt, retry_after(e))
+                    logging.warning(f"Throttled ({e}), retrying in {delay:.1f}s")
+                else:
+                    if self.limiter is not None:
+                        self.limiter.success(size_of(result) if size_of else 0, time.monotonic() - started)
+                    return result
+            # sleep outside the slot so other tracks can use it once the limit allows
+            time.sleep(delay)
+
+    def fetch_audio_retrying(self, video_url: str, output_path: str, with_artist: bool = False, source: str | None = None,
+                             on_source=None) -> tuple:
+        # each attempt resumes the source the one before it started
+        chosen: list = [source]
+
+        def started(path: str) -> None:
+            chosen[0] = path
+            if on_source is not None:
+                on_source(path)
+        return self.retrying(lambda: self.fetch_audio(video_url, output_path, with_artist, chosen[0], started),
+                             lambda result: os.path.getsize(result[0]))
+
+    def stream_audio_retrying(self, video_url: str, output_path: str, with_artist: bool = False) -> tuple:
+        return self.retrying(lambda: self.stream_audio(video_url, output_path, with_artist),
+                             lambda result: os.path.getsize(result[0]))
+
+    def save_audio(self, video_url: str, output_path: str, with_artist: bool = False) -> str:
+        """ fetch and convert one track, returns its title """
+        linked = self.link_existing(video_url, output_path, with_artist)
+        if linked is not None:
+            return linked[1]
+        if self.stream:
+            dest, title = self.stream_audio_retrying(video_url, output_path, with_artist)
+        else:
+            sources: list = []
+            try:
+                source, dest, title, codec = self.fetch_audio_retrying(video_url, output_path, with_artist,
+                                                                       on_source=sources.append)
+            except Exception:
+                # nothing records the name of a source this path made, so a partial one cannot be resumed later
+                for source in sources:
+                    discard(source)
+                raise
+            self.ffmpeg_extract_audio(source, dest, codec, track=video_url)
+            discard(source)
+        self.remember(dest)
+        return title
+
+    def plan_sync(self, manifest: Manifest, urls: list, album_path: str, prune: bool = False, complete: bool = True) -> list:
+        """ the urls a sync still has to fetch, deleting the files of dropped tracks when asked to prune
+            and the listing can be trusted, a prune it refuses is reported as a failure of the playlist """
+        video_ids = [self.video_id(url) for url in urls]
+        new, removed = manifest.diff(video_ids)
+        refused = manifest.unsafe_prune(video_ids, removed, complete) if prune and removed else None
+        if refused is not None:
+            url = item_url({'id': manifest.playlist_id, 'type': "playlist"})
+            message = f"Not pruning {manifest.playlist_id}: {refused}"
+            logging.error(message)
+            self.report.add(url, album_path, (url, False, message), manifest.playlist_id)
+        pruned = manifest.prune(removed) if prune and refused is None else 0
+        if pruned:
+            self.metrics.add('pruned', pruned)
+        self.report.synced.append({'item': manifest.playlist_id, 'tracks': len(video_ids), 'new': len(new),
+                                   'removed': len(removed), 'pruned': pruned, 'complete': complete})
+        new = set(new)
+        return [url for url in urls if self.video_id(url) in new]
+
+    def record_sync(self, manifest: Manifest, urls: list, album_path: str) -> None:
+        """ add the tracks that made it into ``album_path`` to the manifest and save it """
+        for url in urls:
+            video_id = self.video_id(url)
+            dest = self.index.locate(video_id, self.profile.key, album_path) if self.index is not None else None
+            if dest is not None:
+                manifest.add(video_id, dest)
+        manifest.save()
 
     def create_directory(self, directory_path: str) -> bool:
         if not os.path.exists(directory_path):
@@ -31,154 +353,233 @@ class Base:
             return False
 
 
+class BrowserPool:
+    """ keep one headless chromium alive for a whole job and hand out a fresh context per playlist """
+    def __init__(self, headless: bool = True, timeout: int = 10000) -> None:
+        self.headless: bool = headless
+        self.timeout: int = timeout
+        self.playwright = None
+        self.browser = None
+        self.launches: int = 0
+        self.pages: int = 0
+
+    @property
+    def launches_avoided(self) -> int:
+        return max(self.pages - self.launches, 0)
+
+    def _ensure_browser(self):
+        if self.browser is None or not self.browser.is_connected():
+            if self.playwright is None:
+                self.playwright = sync_playwright().start()
+            self.browser = self.playwright.chromium.launch(headless=self.headless)
+            self.launches += 1
+        return self.browser
+
+    @contextlib.contextmanager
+    def page(self):
+        browser = self._ensure_browser()
+        self.pages += 1
+        context = browser.new_context()
+        page = context.new_page()
+        page.set_default_timeout(self.timeout)
+        try:
+            yield page
+        finally:
+            context.close()
+
+    def close(self) -> None:
+        try:
+            if self.browser is not None:
+                self.browser.close()
+        finally:
+            self.browser = None
+            if self.playwright is not None:
+                self.playwright.stop()
+                self.playwright = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
 class Downloader(Base):
+    def __init__(self, stream: bool = False, profile: OutputProfile | None = None, connections: int = 4,
+                 cache: MetadataCache | None = None, workers: int | None = None) -> None:
+        super().__init__(stream, profile, connections, cache)
+        self.resolver: PlaylistResolver | None = None
+        self.browser_pool: BrowserPool | None = None
+        self.workers: int = workers or DEFAULT_WORKERS
+        self.pool: ThreadPoolExecutor | None = None
+
     def download_video(self, args) -> tuple:
         video_url, output_path = args
         try:
-            yt = YouTube(video_url)
-            video_stream = yt.streams.filter(only_audio=True).order_by('abr').desc().first()
-            og_filename = video_stream.default_filename.replace('?','').replace('/', '').replace(',','').replace('*','').replace('"','')
-            video_stream.download(output_path, filename=og_filename)
-            dest_filename = video_stream.title.replace('?','').replace('/', '').replace(',','').replace('*','').replace('"','')
-            self.ffmpeg_extract_audio(f"{output_path}/{og_filename}", f"{output_path}/{dest_filename}.mp3")
-            return (video_url, True, f"Download successful for {video_stream.title}")
+            title = self.save_audio(video_url, output_path)
+            return (video_url, True, f"Download successful for {title}")
         except Exception as e:
             error_message = f"Error downloading video from {video_url}: {e}"
             return (video_url, False, error_message)
 
-    def download(self, id: list | str, path: str) -> None:
-        if isinstance(id, list):
-            for i in id:
-                with sync_playwright() as pw:
-                    browser = pw.chromium.launch(headless=True)
-                    page = browser.new_page()
-                    page.set_default_timeout(10000)
-                    try:
-                        page.goto(f"https://www.youtube.com/playlist?list={i['id']}")
-                        thumbnail_links = page.locator('#thumbnail a').all()
-                        urlslist  = [f"https://www.youtube.com{link.get_attribute('href')}" for link in thumbnail_links if link.get_attribute('href')]
-                        times = page.locator('#text').all()
-                        albumElement = page.locator('#text').first
-                        albumName = albumElement.text_content().replace('?','').replace('/', '').replace(',','').replace('*','').replace('|', '').replace('"','')
-                        timelist = [time_element.inner_text() for time_element in times if time_element.get_attribute('aria-label')]
-                        strip_times = [time.strip() for time in timelist]
-                        convertTime = lambda time_str: (datetime.strptime(re.sub(r'\s+', ' ', time_str).strip(), "%M:%S") - datetime(1900, 1, 1)).total_seconds()
-                        totalTime = [convertTime(times) for times in strip_times if convertTime(times) < 900]
-                        urls = [urlslist[index] for index in range(len(totalTime))]
-                    except Exception as e:
-                        logging.exception(f"An error occurred: {str(e)}")
-                    finally:
-                        soup = BeautifulSoup(page.content(), 'html.parser')
-                        headers = soup.find_all("yt-formatted-string")
-                        browser.close()
+    def resolve_playlist(self, playlist_id: str, page) -> tuple:
+        """ album name and track urls read from the rendered page, raises when no tracks could be read """
+        albumName: str = playlist_id
+        urls: list = []
+        try:
+            page.goto(f"https://www.youtube.com/playlist?list={playlist_id}")
+            thumbnail_links = page.locator('#thumbnail a').all()
+            urlslist  = [f"https://www.youtube.com{link.get_attribute('href')}" for link in thumbnail_links if link.get_attribute('href')]
+            times = page.locator('#text').all()
+            albumElement = page.locator('#text').first
+            albumName = albumElement.text_content().replace('?','').replace('/', '').replace(',','').replace('*','').replace('|', '').replace('"','')
+            timelist = [time_element.inner_text() for time_element in times if time_element.get_attribute('aria-label')]
+            strip_times = [time.strip() for time in timelist]
+            convertTime = lambda time_str: (datetime.strptime(re.sub(r'\s+', ' ', time_str).strip(), "%M:%S") - datetime(1900, 1, 1)).total_seconds()
+            totalTime = [convertTime(times) for times in strip_times if convertTime(times) < 900]
+            urls = [urlslist[index] for index in range(len(totalTime))]
+        finally:
+            soup = BeautifulSoup(page.content(), 'html.parser')
+            headers = soup.find_all("yt-formatted-string")
+            try:
+                meta = [re.split("•|-", i.text) for i in headers if "Album" in i.text]
+                albumName = f"{meta[1][0]} - {meta[0][-1]}"
+            except Exception:
+                pass
+        if not urls:
+            raise ValueError(f"No tracks found for playlist {playlist_id}")
+        return albumName, urls
+
+    def resolve(self, playlist_id: str) -> tuple:
+        """ album name, track urls and whether they are the whole playlist, over http first and through chromium
+            only if that fails """
+        if self.resolver is None:
+            self.resolver = PlaylistResolver()
+        with self.metrics.timer("enumerate"):
+            playlist = self.resolver.resolve(playlist_id)
+        if playlist is not None:
+            return playlist.album_name, playlist.urls, playlist.complete
+        self.metrics.add('retries', reason="browser")
+        if self.browser_pool is None:
+            self.browser_pool = BrowserPool()
+        launches = self.browser_pool.launches
+        try:
+            with self.metrics.timer("browser"), self.browser_pool.page() as page:
+                albumName, urls = self.resolve_playlist(playlist_id, page)
+        finally:
+            self.metrics.add('browser_pages')
+            self.metrics.add('browser_launches', self.browser_pool.launches - launches)
+        # the page only renders the first hundred tracks without scrolling
+        return albumName, urls, False
+
+    def download_album(self, urls: list, path: str, albumName: str) -> list:
+        """ download the tracks into the album folder, returns the urls that succeeded """
+        album_path = f"{path}/{albumName}"
+        self.create_directory(album_path)
+        pool = self.start_pool()
+        tasks = [(url, album_path) for url in urls]
+        succeeded: list = []
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # only the tracks that failed go back to the pool
+                self.report.retried += len(tasks)
+                self.metrics.add('retries', len(tasks), reason="track")
+            results = list(pool.map(self.download_video, tasks))
+            for url, ok, message in results:
+                self.report.add(url, album_path, (url, ok, message), albumName)
+                self.metrics.add('tracks', result="ok" if ok else "failed")
+            succeeded += [url for url, ok, _ in results if ok]
+            tasks = [task for task, result in zip(tasks, results) if not result[1]]
+            if not tasks:
+                break
+        return succeeded
+
+    def start_pool(self) -> ThreadPoolExecutor:
+        """ the track workers, started on first use and kept until close() """
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+            self.metrics.add('pools')
+        return self.pool
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+    def download(self, id: list | str, path: str, sync: bool = False, prune: bool = False) -> JobReport:
+        """ download whole playlists, with ``sync`` only the tracks added since the last sync """
+        playlist_ids: list = [i['id'] for i in id] if isinstance(id, list) else [id]
+        self.report = JobReport()
+        self.index = FileIndex.for_library(path)
+        # a pool started here ends with this call, one started by the caller stays warm for the next
+        owns_pool: bool = self.pool is None
+        with BrowserPool() as browser_pool:
+            self.browser_pool = browser_pool
+            try:
+                for playlist_id in playlist_ids:
+                    with self.metrics.timer("job"):
                         try:
-                            meta = [re.split("•|-", i.text) for i in headers if "Album" in i.text]
-                            albumName = f"{meta[1][0]} - {meta[0][-1]}"
-                        except Exception:
-                            pass
-                        album_path = f"{path}/{albumName}"
-                        self.create_directory(album_path)
-                        processes = 10
-                        arguments = [(url, album_path) for url in urls]
-                        with multiprocessing.Pool(processes=processes) as pool:
-                            pool.map(self.download_video, arguments)
-                        pool.close()
-                        pool.join()
-                        for filename in os.listdir(album_path):
-                            if not filename.endswith('.mp3'):
-                                filepath = os.path.join(album_path, filename)
-                                try:
-                                    os.remove(filepath)
-                                except Exception as e:
-                                    pass
-        else:
-            with sync_playwright() as pw:
-                browser = pw.chromium.launch(headless=True)
-                page = browser.new_page()
-                try:
-                    page.goto(f"https://www.youtube.com/playlist?list={id}")
-                    thumbnail_links = page.locator('#thumbnail a').all()
-                    urlslist  = [f"https://www.youtube.com{link.get_attribute('href')}" for link in thumbnail_links if link.get_attribute('href')]
-                    times = page.locator('#text').all()
-                    albumElement = page.locator('#text').first
-                    albumName = albumElement.text_content().replace('?','').replace('/', '').replace(',','').replace('*','').replace('|', '').replace('"','')
-                    timelist = [time_element.inner_text() for time_element in times if time_element.get_attribute('aria-label')]
-                    strip_times = [time.strip() for time in timelist]
-                    convertTime = lambda time_str: (datetime.strptime(re.sub(r'\s+', ' ', time_str).strip(), "%M:%S") - datetime(1900, 1, 1)).total_seconds()
-                    totalTime = [convertTime(times) for times in strip_times if convertTime(times) < 900]
-                    urls = [urlslist[index] for index in range(len(totalTime))]
-                    page.wait_for_timeout(2500)
-                except Exception as e:
-                    logging.exception(f"An error occurred: {str(e)}")
-                finally:
-                    soup = BeautifulSoup(page.content(), 'html.parser')
-                    headers = soup.find_all("yt-formatted-string")
-                    browser.close()
-                    try:
-                        meta = [re.split("•|-", i.text) for i in headers if "Album" in i.text]
-                        albumName = f"{meta[1][0]} - {meta[0][-1]}"
-                    except Exception:
-                        pass
-                    album_path = f"{path}/{albumName}"
-                    self.create_directory(album_path)
-                    processes = 10
-                    arguments = [(url, album_path) for url in urls]
-                    with multiprocessing.Pool(processes=processes) as pool:
-                        pool.map(self.download_video, arguments)
-                    pool.close()
-                    pool.join()
-                    for filename in os.listdir(album_path):
-                        if not filename.endswith('.mp3'):
-                            filepath = os.path.join(album_path, filename)
-                            try:
-                                os.remove(filepath)
-                            except Exception as e:
-                                logging.exception(e)
+                            albumName, urls, complete = self.retrying(lambda: self.resolve(playlist_id))
+                        except Exception as e:
+                            # one unreadable playlist should not end the job for the rest
+                            logging.exception(f"Could not resolve {playlist_id}: {e}")
+                            url = item_url({'id': playlist_id, 'type': "playlist"})
+                            self.report.add(url, path, (url, False, f"Could not resolve {playlist_id}: {e}"), playlist_id)
+                            continue
+                        manifest = Manifest.for_playlist(path, playlist_id) if sync or prune else None
+                        if manifest is not None:
+                            urls = self.plan_sync(manifest, urls, f"{path}/{albumName}", prune, complete)
+                        # a sync with nothing new never starts the pool
+                        succeeded = self.download_album(urls, path, albumName) if urls else []
+                        if manifest is not None:
+                            self.record_sync(manifest, succeeded, f"{path}/{albumName}")
+            finally:
+                self.browser_pool = None
+                if owns_pool:
+                    self.close()
+                self.index.close()
+                self.index = None
+        return self.report
 
 
 class SingleDownload(Base):
     def download_video(self, video_id: str, output_path: str) -> tuple:
         try:
             video_url = f"https://www.youtube.com/watch?v={video_id}"
-            yt = YouTube(video_url)
-            video_stream = yt.streams.filter(only_audio=True).order_by('abr').desc().first()
-            artist = yt.vid_info['videoDetails']['author']
-            og_filename = video_stream.default_filename.replace('?','').replace('/', '').replace(',','').replace('*','').replace('"','')
-            video_stream.download(output_path, filename=og_filename)
-            dest_filename = video_stream.title.replace('?','').replace('/', '').replace(',','').replace('*','').replace('"','')
-            self.ffmpeg_extract_audio(f"{output_path}/{og_filename}", f"{output_path}/{artist} - {dest_filename}.mp3")
-            return (video_url, True, f"Download successful for {video_stream.title}")
+            title = self.save_audio(video_url, output_path, with_artist=True)
+            self.metrics.add('tracks', result="ok")
+            return (video_url, True, f"Download successful for {title}")
         except Exception as e:
+            self.metrics.add('tracks', result="failed")
             error_message = f"Error downloading video from {video_url}: {e}"
             return (video_url, False, error_message)
 
-    def download(self, id: list | str, path: str) -> None:
-        if isinstance(id, list):
-            for i in id:
-                album_path = f"{path}/"
-                self.create_directory(album_path)
-                downloading = self.download_video(i['id'], album_path)
-                if downloading:
-                    for filename in os.listdir(album_path):
-                        if not filename.endswith('.mp3'):
-                            filepath = os.path.join(album_path, filename)
-                            try:
-                                os.remove(filepath)
-                            except Exception as e:
-                                pass
-        else:
+    def download(self, id: list | str, path: str) -> JobReport:
+        self.report = JobReport()
+        self.index = FileIndex.for_library(path)
+        try:
             album_path = f"{path}/"
             self.create_directory(album_path)
-            downloading = self.download_video(id, album_path)
-            if downloading:
-                for filename in os.listdir(album_path):
-                    if not filename.endswith('.mp3'):
-                        filepath = os.path.join(album_path, filename)
-                        try:
-                            os.remove(filepath)
-                        except Exception as e:
-                            pass
+            pending: list = [i['id'] for i in id] if isinstance(id, list) else [id]
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    self.report.retried += len(pending)
+                    self.metrics.add('retries', len(pending), reason="track")
+                failed: list = []
+                # each task cleans up after itself, so the library root is never listed here
+                for video_id in pending:
+                    result = self.download_video(video_id, album_path)
+                    self.report.add(result[0], album_path, result, video_id)
+                    if not result[1]:
+                        failed.append(video_id)
+                pending = failed
+                if not pending:
+                    break
+        finally:
+            self.index.close()
+            self.index = None
+        return self.report
 if __name__ == "__main__":
-    playlist_id = str(input('Enter Playlist Id: '))
-    downloader = SingleDownload()
-    downloader.download(playlist_id, "path")
+    # kept for old habits, the command line lives in cli.py
+    from cli import main
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import contextlib
+from cache import cache_dir
+
+STATE_DIR = ".ytmusic-dl"
+PENDING = "pending"
+FETCHED = "fetched"
+TRANSCODED = "transcoded"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    item_id TEXT NOT NULL,
+    root TEXT NOT NULL,
+    type TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL DEFAULT 'queued',
+    created REAL NOT NULL,
+    PRIMARY KEY (item_id, root)
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    video_id TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    root TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    source TEXT,
+    dest TEXT,
+    title TEXT,
+    codec TEXT,
+    message TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (video_id, output_path)
+);
+CREATE INDEX IF NOT EXISTS tracks_item ON tracks (item_id, root);
+"""
+
+
+def state_path(root: str, name: str) -> str:
+    """ location of a state file kept inside the library it describes """
+    directory = os.path.join(root, STATE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, name)
+
+
+def database_path(root: str, name: str) -> str:
+    """ location of a library's sqlite store, kept on local disk keyed by the library path because wal needs
+    shared memory a network share cannot give it, one left inside the library by older versions is copied over """
+    key = hashlib.sha1(os.path.abspath(root).encode('utf-8')).hexdigest()[:16]
+    directory = os.path.join(cache_dir(), 'libraries', key)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    legacy = os.path.join(root, STATE_DIR, name)
+    if not os.path.exists(path) and os.path.exists(legacy):
+        try:
+            with contextlib.closing(sqlite3.connect(legacy)) as source, contextlib.closing(sqlite3.connect(path)) as copy:
+                source.backup(copy)
+        except sqlite3.Error as e:
+            logging.exception(f"Could not carry over {legacy}: {e}")
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+    return path
+
+
+class Journal:
+    """ durable record of queued items and per-track progress so an interrupted job can pick up where it stopped """
+    def __init__(self, path: str) -> None:
+        self.path: str = path
+        self.lock: threading.Lock = threading.Lock()
+        self.db: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    @classmethod
+    def for_library(cls, root: str) -> "Journal":
+        return cls(database_path(root, "journal.sqlite3"))
+
+    def close(self) -> None:
+        with self.lock:
+            self.db.close()
+
+    def add_items(self, items: list, root: str) -> None:
+        now = time.time()
+        with self.lock:
+            self.db.executemany(
+                "INSERT INTO items (item_id, root, type, title, state, created) VALUES (?, ?, ?, ?, 'queued', ?) "
+                "ON CONFLICT (item_id, root) DO UPDATE SET state = CASE WHEN state = 'done' THEN 'queued' ELSE state END, "
+                "title = CASE WHEN excluded.title != '' THEN excluded.title ELSE title END",
+                [(item['id'], root, item['type'], item.get('title') or '', now) for item in items])
+
+    def unfinished_items(self, root: str) -> list:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT item_id, type, title FROM items WHERE root = ? AND state != 'done' ORDER BY created",
+                (root,)).fetchall()
+        return [{'id': row['item_id'], 'type': row['type'], 'title': row['title']} for row in rows]
+
+    def tracks(self, item_id: str, root: str) -> list | None:
+        """ tracks recorded for an item, None if it was never resolved """
+        with self.lock:
+            item = self.db.execute("SELECT state FROM items WHERE item_id = ? AND root = ?", (item_id, root)).fetchone()
+            if item is None or item['state'] == 'queued':
+                return None
+            return self.db.execute(
+                "SELECT * FROM tracks WHERE item_id = ? AND root = ? ORDER BY position", (item_id, root)).fetchall()
+
+    def record_tracks(self, item_id: str, root: str, jobs: list) -> None:
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                "INSERT INTO tracks (video_id, output_path, item_id, root, kind, position, updated) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (video_id, output_path) DO NOTHING",
+                [(job.video_id, job.output_path, item_id, root, job.kind, position, now) for position, job in enumerate(jobs)])
+            self.db.execute("UPDATE items SET state = 'resolved' WHERE item_id = ? AND root = ?", (item_id, root))
+            self.db.execute("COMMIT")
+
+    def set_state(self, job, state: str, **fields) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        sql = f"UPDATE tracks SET state = ?, updated = ?{', ' + columns if columns else ''} WHERE video_id = ? AND output_path = ?"
+        with self.lock:
+            self.db.execute(sql, (state, time.time(), *fields.values(), job.video_id, job.output_path))
+
+    def close_items(self, root: str) -> None:
+        """ mark items done once every one of their tracks is """
+        with self.lock:
+            self.db.execute(
+                "UPDATE items SET state = 'done' WHERE root = ? AND state = 'resolved' AND NOT EXISTS "
+                "(SELECT 1 FROM tracks WHERE tracks.item_id = items.item_id AND tracks.root = items.root AND tracks.state != 'done')",
+                (root,))
+
+    def forget(self, item_id: str, root: str) -> None:
+        with self.lock:
+            self.db.execute("DELETE FROM tracks WHERE item_id = ? AND root = ?", (item_id, root))
+            self.db.execute("DELETE FROM items WHERE item_id = ? AND root = ?", (item_id, root))
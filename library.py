@@ -0,0 +1,121 @@
+import re
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from PyQt5.QtCore import (
+    Qt,
+    QAbstractTableModel,
+    QModelIndex,
+    QSortFilterProxyModel)
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list:
+    return TOKEN.findall(text.lower())
+
+
+@dataclass
+class LibraryRow:
+    name: str
+    is_album: bool
+    tracks: int = 0
+    track_names: list = field(default_factory=list)
+
+
+def library_rows(catalog) -> list:
+    """ one row per top level folder or loose track, with the tracks found beneath it """
+    albums: dict = {name: LibraryRow(name, True) for name in catalog.folders()}
+    singles: list = []
+    for track in catalog.tracks():
+        if track['dir'] == '':
+            singles.append(LibraryRow(track['name'], False, 1, [track['name']]))
+            continue
+        top = track['path'].replace('\\', '/').split('/')[0]
+        album = albums.setdefault(top, LibraryRow(top, True))
+        album.tracks += 1
+        album.track_names.append(track['name'])
+    return list(albums.values()) + singles
+
+
+class LibraryIndex:
+    """ lowercase token index answering prefix queries without touching every row """
+    def __init__(self, rows: list) -> None:
+        postings: dict = {}
+        for number, row in enumerate(rows):
+            for text in [row.name] + row.track_names:
+                for token in tokenize(text):
+                    postings.setdefault(token, set()).add(number)
+        self.tokens: list = sorted(postings)
+        self.postings: dict = postings
+        self.size: int = len(rows)
+
+    def prefix(self, query: str) -> set:
+        matches: set = set()
+        position = bisect_left(self.tokens, query)
+        while position < len(self.tokens) and self.tokens[position].startswith(query):
+            matches |= self.postings[self.tokens[position]]
+            position += 1
+        return matches
+
+    def search(self, text: str) -> set | None:
+        """ rows matching every word of ``text`` as a prefix, None when nothing is filtered """
+        words = tokenize(text)
+        if not words:
+            return None
+        result: set | None = None
+        for word in sorted(set(words), key=len, reverse=True):
+            matches = self.prefix(word)
+            result = matches if result is None else result & matches
+            if not result:
+                break
+        return result
+
+
+class LibraryModel(QAbstractTableModel):
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.rows: list = []
+        self.index_: LibraryIndex = LibraryIndex([])
+
+    def set_rows(self, rows: list, index: LibraryIndex | None = None) -> None:
+        """ swap in new rows, ``index`` is their search index when it was already built off the gui thread """
+        self.beginResetModel()
+        self.rows = rows
+        self.index_ = index if index is not None else LibraryIndex(rows)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 1
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if index.isValid() and role == Qt.DisplayRole:
+            return self.rows[index.row()].name
+        return None
+
+    def headerData(self, section: int, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return "Album"
+        return super().headerData(section, orientation, role)
+
+    def counts(self, matches: set | None) -> tuple:
+        """ albums and tracks among the matched rows, computed once per filter pass """
+        rows = self.rows if matches is None else [self.rows[number] for number in matches]
+        albums = sum(1 for row in rows if row.is_album and row.tracks)
+        tracks = sum(row.tracks for row in rows)
+        return albums, tracks
+
+
+class LibraryFilter(QSortFilterProxyModel):
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.matches: set | None = None
+
+    def set_matches(self, matches: set | None) -> None:
+        self.matches = matches
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        return self.matches is None or source_row in self.matches
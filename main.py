@@ -1,16 +1,39 @@
 import os
 import sys
 import ctypes
+import queue
 import logging
-import requests
-from bs4 import BeautifulSoup
+import threading
 from PyQt5.QtGui import QIcon
 from ui import (
     QtWidgets,
     Ui_MainWindow)
-from downloader import (
-    Downloader,
-    SingleDownload)
+from scheduler import Scheduler
+from journal import (
+    Journal,
+    state_path)
+from catalog import Catalog
+from tempfiles import sweep_orphans
+from cache import MetadataCache
+from resolver import (
+    TitleResolver,
+    parse_item,
+    parse_items)
+from concurrent.futures import ThreadPoolExecutor
+from library import (
+    LibraryModel,
+    LibraryFilter,
+    LibraryIndex,
+    library_rows)
+from profiles import (
+    PROFILES,
+    DEFAULT_PROFILE,
+    OutputProfile,
+    get_profile)
+from progress import (
+    ProgressTracker,
+    human_bytes,
+    human_duration)
 from PyQt5.QtWidgets import (
     QMainWindow,
     QApplication,
@@ -18,6 +41,9 @@ from PyQt5.QtWidgets import (
     QFileDialog,
     QMessageBox,
     QPushButton,
+    QMenu,
+    QComboBox,
+    QTableView,
     QTableWidgetItem)
 from PyQt5.QtCore import (
     pyqtSlot,
@@ -25,36 +51,169 @@ from PyQt5.QtCore import (
     QObject,
     QThread,
     QFile,
+    QTimer,
+    QModelIndex,
     pyqtSignal)
 
+# seconds closing the window waits for transfers already running before it gives up on them
+CLOSE_TIMEOUT: float = 5.0
 
-class PlaylistWorker(QObject):
-    finished = pyqtSignal()
-    progress = pyqtSignal(int)
 
-    def __init__(self, playlist_id: str | list, settings: str) -> None:
+def placeholder_title(item_id: str) -> str:
+    return f"Resolving {item_id}..."
+
+
+class QueueWorker(QObject):
+    """ one scheduler for the whole window, items from either tab join the run in progress when they go to the same
+    library with the same profile so a single is not stuck behind an album, signals carry the tab an item came from """
+    finished = pyqtSignal(str)
+    progress = pyqtSignal(str, int, int)
+    transfer = pyqtSignal(str, dict)
+    failures = pyqtSignal(list)
+
+    def __init__(self, cache: MetadataCache) -> None:
         super().__init__()
-        self.playlist_id: str | list = playlist_id
-        self.settings: str = settings
+        self.scheduler: Scheduler = Scheduler("", cache=cache)
+        self.scheduler.on_item_done = self.item_done
+        self.pending: queue.Queue = queue.Queue()
+        self.stopped: bool = False
+        self.lock: threading.Lock = threading.Lock()
+        # item id -> tab it was queued from, and tab -> items of it not finished yet
+        self.tabs: dict = {}
+        self.active: dict = {}
+        # ids handed to the run in progress, whatever it leaves unreported is released when it ends
+        self.current: set = set()
+
+    def submit(self, tab: str, items: list, settings: str, profile: OutputProfile):
+        with self.lock:
+            for item in items:
+                self.tabs[item['id']] = tab
+            self.active[tab] = self.active.get(tab, 0) + len(items)
+        # not under the lock, the scheduler reports finished items while holding its own
+        if self.scheduler.add(items, settings, profile):
+            with self.lock:
+                self.current.update(item['id'] for item in items)
+            return
+        self.pending.put((items, settings, profile))
+
+    def item_done(self, item_id: str):
+        with self.lock:
+            tab: str | None = self.tabs.pop(item_id, None)
+            if tab is None:
+                return
+            self.active[tab] -= 1
+            if self.active[tab] > 0:
+                return
+            del self.active[tab]
+        self.finished.emit(tab)
+
+    def stop(self):
+        self.stopped = True
+        self.scheduler.cancel()
+        self.pending.put(None)
 
     def run(self):
-        downloader: Downloader = Downloader()
-        downloader.download(self.playlist_id, self.settings)
-        self.finished.emit()
+        # the browser pool is bound to this thread, so every run and the final close happen here
+        while True:
+            job: tuple | None = self.pending.get()
+            if job is None:
+                self.scheduler.close()
+                return
+            if not self.stopped:
+                self.download(*job)
+
+    def download(self, items: list, settings: str, profile: OutputProfile):
+        journal: Journal = Journal.for_library(settings)
+        scheduler: Scheduler = self.scheduler
+        scheduler.cancelled = self.stopped
+        scheduler.path = settings
+        scheduler.profile = profile
+        scheduler.journal = journal
+        scheduler.on_job_done = lambda job, result, done, total: self.progress.emit(
+            self.tabs.get(job.item_id, "bulk"), done, total)
+        # snapshots are throttled by the tracker so the queued signals cannot swamp the event loop
+        scheduler.progress = ProgressTracker(self.broadcast)
+        with self.lock:
+            self.current = {item['id'] for item in items}
+        try:
+            scheduler.run(items)
+            scheduler.metrics.write(state_path(settings, "metrics.json"))
+            scheduler.report.write(state_path(settings, "report.json"))
+            if scheduler.report.failures:
+                self.failures.emit(scheduler.report.failures)
+        except Exception as e:
+            logging.exception(str(e))
+        finally:
+            journal.close()
+        # anything the run gave up on without reporting, a cancel for one, still releases its tab
+        with self.lock:
+            left: set = self.current
+            self.current = set()
+        for item_id in left:
+            self.item_done(item_id)
+
+    def broadcast(self, snapshot: dict):
+        """ one run carries every tab's items, so each tab still waiting sees the shared transfer figures """
+        with self.lock:
+            tabs: list = list(self.active)
+        for tab in tabs:
+            self.transfer.emit(tab, snapshot)
+
+
+class TitleFetcher(QObject):
+    resolved = pyqtSignal(str, str)
+
+    def __init__(self, cache: MetadataCache, workers: int = 4) -> None:
+        super().__init__()
+        self.cache: MetadataCache = cache
+        self.resolver: TitleResolver = TitleResolver()
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers)
+
+    def fetch(self, item: dict):
+        self.executor.submit(self.run, item)
 
+    def run(self, item: dict):
+        cached: dict | None = self.cache.get(item['id'], 'title')
+        if cached is not None:
+            title: str = cached['title']
+        else:
+            try:
+                title: str = self.resolver.title(item)
+                self.cache.update(item['id'], title=title)
+            except Exception as e:
+                logging.exception(str(e))
+                title: str = item['id']
+        self.resolved.emit(item['id'], title)
 
-class SingleWorker(QObject):
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class CatalogWorker(QObject):
+    """ loads the catalogued rows and their search index, then rescans and loads again if anything moved,
+    all off the gui thread """
     finished = pyqtSignal()
-    progress = pyqtSignal(int)
+    loaded = pyqtSignal(list, object)
 
-    def __init__(self, video_id: str | list, settings: str) -> None:
+    def __init__(self, directory: str) -> None:
         super().__init__()
-        self.video_id: str | list = video_id
-        self.settings: str  = settings
+        self.directory: str = directory
+
+    def load(self, catalog: Catalog):
+        rows: list = library_rows(catalog)
+        self.loaded.emit(rows, LibraryIndex(rows))
 
     def run(self):
-        downloader: SingleDownload = SingleDownload()
-        downloader.download(self.video_id, self.settings)
+        try:
+            catalog: Catalog = Catalog(self.directory)
+            try:
+                self.load(catalog)
+                if catalog.scan():
+                    self.load(catalog)
+            finally:
+                catalog.close()
+        except Exception as e:
+            logging.exception(str(e))
         self.finished.emit()
 
 
@@ -72,15 +231,30 @@ class MainWindow(QMainWindow):
         font.setPointSize(14)
         self.ui.app_label.setFont(font)
         self.ui.app_label.setText("YTmusic-dl")
-        self.ui.tableWidget.setColumnWidth(0, 463)
-        self.ui.tableWidget.itemDoubleClicked.connect(self.open_path)
-        self.ui.search_bar.textChanged.connect(self.filter_table)
+        self.setup_library_view()
+        self.search_timer: QTimer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.filter_table)
+        self.ui.search_bar.textChanged.connect(self.search_timer.start)
         self.ui.single_dl_btn.setEnabled(False)
         self.ui.bulk_dl.setEnabled(False)
         self.ui.bulk_add.setEnabled(False)
         self.ui.single_input.textChanged.connect(self.enabledownload)
         self.ui.bulk_edit.textChanged.connect(self.enableurledit)
         self.download_queue: list = []
+        self.cache: MetadataCache = MetadataCache()
+        self.title_fetcher: TitleFetcher = TitleFetcher(self.cache, workers=8)
+        self.title_fetcher.resolved.connect(self.title_resolved)
+        self.resolved_titles: dict = {}
+        self.title_timer: QTimer = QTimer(self)
+        self.title_timer.setSingleShot(True)
+        self.title_timer.setInterval(100)
+        self.title_timer.timeout.connect(self.apply_titles)
+        self.setup_import_button()
+        self.setup_profile_selector()
+        self.setup_queue_worker()
+        self.restore_queue()
 
     def enableurledit(self):
         if len(self.ui.bulk_edit.text()) > 5:
@@ -94,8 +268,58 @@ class MainWindow(QMainWindow):
         else:
             self.ui.single_dl_btn.setEnabled(False)
 
-    def open_path(self, item: QTableWidgetItem):
-        folder: str = item.text()
+    def setup_import_button(self):
+        self.bulk_import: QPushButton = QPushButton("Import", self.ui.page)
+        self.bulk_import.setObjectName("bulk_import")
+        menu: QMenu = QMenu(self.bulk_import)
+        menu.addAction("From clipboard", self.import_clipboard)
+        menu.addAction("From file...", self.import_file)
+        self.bulk_import.setMenu(menu)
+        self.ui.horizontalLayout.addWidget(self.bulk_import)
+
+    def setup_profile_selector(self):
+        """ the output format downloads use, kept in the Profile setting """
+        self.profile_select: QComboBox = QComboBox(self.ui.folder_view)
+        self.profile_select.setObjectName("profile_select")
+        for name, profile in PROFILES.items():
+            label: str = "Original audio, no re-encoding" if profile.encoder is None else f"{name.upper()} {profile.bitrate} kbps"
+            self.profile_select.addItem(label, name)
+        self.profile_select.setCurrentIndex(self.profile_select.findData(self.output_profile().name))
+        self.profile_select.currentIndexChanged.connect(self.select_profile)
+        self.ui.gridLayout_3.addWidget(self.profile_select, 1, 0, 1, 2)
+
+    def select_profile(self, index: int):
+        self.settings.setValue('Profile', self.profile_select.itemData(index))
+        # a bitrate override was meant for the format it was set with
+        self.settings.remove('Bitrate')
+
+    def output_profile(self) -> OutputProfile:
+        """ the profile from settings, an unknown name or a broken bitrate falls back to the default """
+        try:
+            return get_profile(self.settings.value('Profile', DEFAULT_PROFILE.name), int(self.settings.value('Bitrate', 0)))
+        except (ValueError, TypeError) as e:
+            logging.warning(f"Ignoring the stored output profile ({e}), using {DEFAULT_PROFILE.name}")
+            return DEFAULT_PROFILE
+
+    def setup_library_view(self):
+        """ swap the generated table widget for a view over the catalog model """
+        self.library_model: LibraryModel = LibraryModel(self)
+        self.library_filter: LibraryFilter = LibraryFilter(self)
+        self.library_filter.setSourceModel(self.library_model)
+        self.library_view: QTableView = QTableView(self.ui.folder_view)
+        self.library_view.setFont(self.ui.tableWidget.font())
+        self.library_view.setObjectName("tableWidget")
+        self.library_view.setModel(self.library_filter)
+        self.library_view.setEditTriggers(QTableView.NoEditTriggers)
+        self.library_view.setSelectionBehavior(QTableView.SelectRows)
+        self.library_view.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.library_view.doubleClicked.connect(self.open_path)
+        self.ui.gridLayout_3.replaceWidget(self.ui.tableWidget, self.library_view)
+        self.ui.tableWidget.deleteLater()
+        self.ui.tableWidget = self.library_view
+
+    def open_path(self, index: QModelIndex):
+        folder: str = self.library_filter.data(index)
         directory: str = self.settings.value('Path')
         path: str = os.path.join(directory, folder)
         if os.path.exists(path):
@@ -110,71 +334,58 @@ class MainWindow(QMainWindow):
             elif sys.platform == 'linux':
                 os.system(f'xdg-open "{path}"')
 
-    def downloader_task(self, playlist_id: str, settings: str):
-        self.thread: QThread = QThread()
-        self.worker: PlaylistWorker = PlaylistWorker(playlist_id, settings)
-        self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.worker.finished.connect(self.enable_single_dl_btn)
+    def setup_queue_worker(self):
+        """ start the one download thread both tabs feed for the life of the window """
+        self.worker: QueueWorker = QueueWorker(self.cache)
+        # a plain daemon thread, a QThread still running when the window goes would abort the process
+        self.thread: threading.Thread = threading.Thread(target=self.worker.run, name="queue-worker", daemon=True)
+        self.worker.progress.connect(self.trackprogress)
+        self.worker.transfer.connect(self.track_transfer)
+        self.worker.finished.connect(self.download_finished)
+        self.worker.failures.connect(self.failures_modal)
         self.thread.start()
 
-    def single_downloader_task(self, video_id: str, settings: str):
-        self.thread: QThread = QThread()
-        self.worker: SingleWorker = SingleWorker(video_id, settings)
-        self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.worker.finished.connect(self.enable_single_dl_btn)
-        self.thread.start()
+    def downloader_task(self, tab: str, items: list, settings: str):
+        profile: OutputProfile = self.output_profile()
+        self.worker.submit(tab, items, settings, profile)
 
     def load_settings(self):
         if self.settings.contains("Path"):
             Path: str = self.settings.value("Path")
             self.ui.folder_path_line.setText(Path)
+            # temp files from a crashed session, walked once per start off the ui thread
+            threading.Thread(target=sweep_orphans, args=(Path,), daemon=True).start()
 
     def populate_table(self):
-        try:
-            directory: str = self.settings.value("Path")
-            folders: str = os.listdir(directory)
-            self.ui.tableWidget.setRowCount(len(folders))
-            self.ui.tableWidget.horizontalHeader().setSectionResizeMode(1) 
-            albums: int = 0
-            tracks: int = 0
-            for row, folder in enumerate(folders):
-                self.ui.tableWidget.setItem(row, 0, QTableWidgetItem(folder))
-                if folder.endswith(".mp3"):
-                    tracks += 1
-                if "." not in folder:
-                    albums += 1
-            self.ui.total_tracks.setText(f"Total Tracks: {tracks}")
-            self.ui.total_albums.setText(f"Total Albums: {albums}")
-        except Exception:
-            pass
+        """ show the catalogued library as soon as it is read and refresh it once a background rescan finishes """
+        directory: str = self.settings.value("Path")
+        if not directory or getattr(self, 'catalog_thread', None) is not None:
+            return
+        self.catalog_thread: QThread = QThread()
+        self.catalog_worker: CatalogWorker = CatalogWorker(directory)
+        self.catalog_worker.moveToThread(self.catalog_thread)
+        self.catalog_thread.started.connect(self.catalog_worker.run)
+        self.catalog_worker.finished.connect(self.catalog_thread.quit)
+        self.catalog_worker.finished.connect(self.catalog_worker.deleteLater)
+        self.catalog_thread.finished.connect(self.catalog_thread.deleteLater)
+        self.catalog_worker.loaded.connect(self.fill_table)
+        # only let go of the thread once it has actually stopped
+        self.catalog_thread.finished.connect(self.catalog_scanned)
+        self.catalog_thread.start()
+
+    def catalog_scanned(self):
+        self.catalog_thread = None
+
+    def fill_table(self, rows: list, index: LibraryIndex):
+        self.library_model.set_rows(rows, index)
+        self.filter_table()
 
     def filter_table(self):
-        search_text: str = self.ui.search_bar.text().lower()
-        albums: int = 0
-        tracks: int = 0
-        for row in range(self.ui.tableWidget.rowCount()):
-            row_visible: bool = False
-            for col in range(self.ui.tableWidget.columnCount()):
-                item = self.ui.tableWidget.item(row, col)
-                if item is not None and search_text in item.text().lower():
-                    row_visible: bool = True
-                    line: str = item.text().lower()
-                    if line.endswith("mp3"):
-                        tracks += 1
-                    if "." not in line:
-                        albums += 1
-                    break
-            self.ui.tableWidget.setRowHidden(row, not row_visible)
-            self.ui.total_albums.setText(f"Total Albums: {albums}")
-            self.ui.total_tracks.setText(f"Total Tracks: {tracks}")
+        matches: set | None = self.library_model.index_.search(self.ui.search_bar.text())
+        self.library_filter.set_matches(matches)
+        albums, tracks = self.library_model.counts(matches)
+        self.ui.total_albums.setText(f"Total Albums: {albums}")
+        self.ui.total_tracks.setText(f"Total Tracks: {tracks}")
 
     @pyqtSlot()
     def on_single_btn_clicked(self):
@@ -195,47 +406,115 @@ class MainWindow(QMainWindow):
 
     @pyqtSlot()
     def on_bulk_add_clicked(self):
+        try:
+            item: dict = parse_item(self.ui.bulk_edit.text())
+        except Exception as e:
+            self.error_modal(e)
+            return
+        self.ui.bulk_edit.clear()
+        self.enqueue([item])
 
-        def get_title(url) -> str:
-            if url.startswith("http"):
-                response: requests.models.Response = requests.get(url)
-                video_id: str = url.split("=")[1]
-                if len(video_id) > 11:
-                    link = f"https://www.youtube.com/playlist?list={video_id}"
-                    response: requests.models.Response = requests.get(link)
-                else:
-                    link = f"https://www.youtube.com/watch?v={video_id}"
-                    response: requests.models.Response = requests.get(link)
-            else:
-                if len(url) > 11:
-                    link = f"https://www.youtube.com/playlist?list={url}"
-                    response: requests.models.Response = requests.get(link)
-                else:
-                    link = f"https://www.youtube.com/watch?v={url}"
-                    response: requests.models.Response = requests.get(link)
-            if response.status_code == 200:
-                page_source = response.text
-                soup: BeautifulSoup = BeautifulSoup(page_source, 'html.parser')
-                title: str = soup.find('title').string.strip()
-            return title
+    def import_clipboard(self):
+        self.import_text(QApplication.clipboard().text())
 
-        self.ui.bulk_dl.setEnabled(True)
+    def import_file(self):
+        file, _ = QFileDialog.getOpenFileName(self, "Import URLs", "", "Text files (*.txt);;All files (*)")
+        if not file:
+            return
         try:
-            self.ui.bulk_table.setRowCount(len(self.download_queue) + 1)
-            url = self.ui.bulk_edit.text()
-            title: str = get_title(url)
-            try:
-                video_id: str = url.split("=")[1]
-            except Exception:
-                pass
+            with open(file, encoding='utf-8', errors='replace') as f:
+                self.import_text(f.read())
+        except OSError as e:
+            logging.exception(str(e))
+            self.error_modal(e)
+
+    def import_text(self, text: str):
+        items, invalid = parse_items(text)
+        added: int = self.enqueue(items)
+        if invalid or not added:
+            msg = QMessageBox()
+            msg.setIcon(QMessageBox.Warning if invalid else QMessageBox.Information)
+            msg.setText(f"Added {added} new item(s), skipped {len(invalid)} line(s) that are not YouTube links or ids")
+            msg.setWindowTitle("Import")
+            msg.exec_()
+
+    def enqueue(self, items: list) -> int:
+        """ append new queue items in one table update and resolve missing titles in the background """
+        known: set = {entry['id'] for entry in self.download_queue}
+        fresh: list = []
+        for item in items:
+            if item['id'] not in known:
+                known.add(item['id'])
+                fresh.append(item)
+        if not fresh:
+            return 0
+        start: int = len(self.download_queue)
+        self.ui.bulk_table.setUpdatesEnabled(False)
+        self.ui.bulk_table.setColumnCount(3)
+        self.ui.bulk_table.setRowCount(start + len(fresh))
+        for row, item in enumerate(fresh, start):
             remove_btn: QPushButton = QPushButton("delete")
-            self.ui.bulk_edit.clear()
-            self.download_queue.append({'title': title, 'type': "playlist" if len(video_id) > 11 else "single", 'button': remove_btn, 'id': video_id})
             remove_btn.clicked.connect(lambda: self.remove_row())
-            self.populate_bulktable()
-            self.ui.bulk_table.resizeColumnToContents(0)
+            # the row shows up right away and gets its real title once the fetcher answers, the placeholder is
+            # only shown, the entry keeps an empty title so it never reaches the journal
+            entry: dict = {'title': item.get('title') or '', 'type': item['type'], 'button': remove_btn, 'id': item['id']}
+            self.download_queue.append(entry)
+            self.ui.bulk_table.setItem(row, 0, QTableWidgetItem(entry['title'] or placeholder_title(item['id'])))
+            self.ui.bulk_table.setItem(row, 1, QTableWidgetItem(entry['type']))
+            self.ui.bulk_table.setCellWidget(row, 2, remove_btn)
+        self.ui.bulk_table.setUpdatesEnabled(True)
+        self.ui.bulk_dl.setEnabled(True)
+        for item in fresh:
+            if not item.get('title'):
+                self.title_fetcher.fetch(item)
+        return len(fresh)
+
+    @pyqtSlot(str, str)
+    def title_resolved(self, item_id: str, title: str):
+        self.resolved_titles[item_id] = title
+        if not self.title_timer.isActive():
+            self.title_timer.start()
+
+    def apply_titles(self):
+        """ write every title that arrived since the last flush in a single table update """
+        titles, self.resolved_titles = self.resolved_titles, {}
+        self.ui.bulk_table.setUpdatesEnabled(False)
+        for row, entry in enumerate(self.download_queue):
+            if entry['id'] in titles:
+                entry['title'] = titles[entry['id']]
+                self.ui.bulk_table.setItem(row, 0, QTableWidgetItem(entry['title']))
+        self.ui.bulk_table.setUpdatesEnabled(True)
+        self.ui.bulk_table.resizeColumnToContents(0)
+
+    def journal(self) -> Journal | None:
+        if not self.settings.contains('Path') or len(self.settings.value('Path')) < 4:
+            return None
+        return Journal.for_library(self.settings.value('Path'))
+
+    def restore_queue(self):
+        """ put items an interrupted run left unfinished back into the bulk queue """
+        try:
+            journal: Journal | None = self.journal()
+            if journal is None:
+                return
+            unfinished: list = journal.unfinished_items(self.settings.value('Path'))
+            journal.close()
         except Exception as e:
-            self.error_modal(e)
+            logging.exception(str(e))
+            return
+        # older journals saved the placeholder as the title, those get resolved again
+        for item in unfinished:
+            if item['title'] == placeholder_title(item['id']):
+                item['title'] = ''
+        self.enqueue(unfinished)
+
+    def forget_items(self, items: list):
+        journal: Journal | None = self.journal()
+        if journal is None:
+            return
+        for item in items:
+            journal.forget(item['id'], self.settings.value('Path'))
+        journal.close()
 
     def populate_bulktable(self):
         for index, rows in enumerate(self.download_queue):
@@ -251,43 +530,22 @@ class MainWindow(QMainWindow):
     def remove_row(self):
         index: int = self.ui.bulk_table.currentRow()
         self.ui.bulk_table.removeRow(index)
+        self.forget_items([self.download_queue[index]])
         del self.download_queue[index]
 
     @pyqtSlot()
     def on_bulk_dl_clicked(self):
-        singles: list = [track for track in self.download_queue if track["type"] == "single"]
-        playlists: list = [track for track in self.download_queue if track["type"] == "playlist"]
-        self.expected = len(singles + playlists)
-        self.current = 0
+        items: list = [{'type': track['type'], 'id': track['id'], 'title': track['title']} for track in self.download_queue]
         self.ui.bulk_dl.setEnabled(False)
         self.ui.clear_dl.setEnabled(False)
-        self.thread: QThread = QThread()
-        self.worker: SingleWorker = SingleWorker(singles, self.settings.value('Path'))
-        self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.worker.finished.connect(lambda x=len(singles): self.trackprogress(x))
-        self.worker.finished.connect(self.enable_bulk_dl_btn)
-        self.thread.start()
-
-        self.threadtwo: QThread = QThread()
-        self.workertwo: PlaylistWorker = PlaylistWorker(playlists, self.settings.value('Path'))
-        self.workertwo.moveToThread(self.threadtwo)
-        self.threadtwo.started.connect(self.workertwo.run)
-        self.workertwo.finished.connect(self.threadtwo.quit)
-        self.workertwo.finished.connect(self.workertwo.deleteLater)
-        self.threadtwo.finished.connect(self.threadtwo.deleteLater)
-        self.workertwo.finished.connect(lambda x=len(playlists): self.trackprogress(x))
-        self.workertwo.finished.connect(self.enable_bulk_dl_btn)
-        self.threadtwo.start()
+        self.downloader_task("bulk", items, self.settings.value('Path'))
         self.ui.bulk_dl.setText("Downloading...")
 
     @pyqtSlot()
     def on_clear_dl_clicked(self):
         for n in range(len(self.download_queue), -1, -1):
             self.ui.bulk_table.removeRow(n)
+        self.forget_items(self.download_queue)
         self.download_queue = []
         self.populate_bulktable()
 
@@ -300,23 +558,66 @@ class MainWindow(QMainWindow):
 
     @pyqtSlot()
     def on_single_dl_btn_clicked(self):
-        url: str = self.ui.single_input.text()
-        if url.startswith("http"):
-            video_id: str = url.split("=")[1]
-        else:
-            video_id: str = url
+        try:
+            item: dict = parse_item(self.ui.single_input.text())
+        except Exception as e:
+            self.error_modal(e)
+            return
         if not self.settings.contains('Path') or len(self.settings.value('Path')) < 4:
             self.error_modal()
         else:
             self.ui.single_dl_btn.setEnabled(False)
             self.ui.single_dl_btn.setText("Downloading...")
-            if len(video_id) > 11:
-                self.downloader_task(video_id, self.settings.value('Path'))
-            else:
-                self.single_downloader_task(video_id, self.settings.value('Path'))
+            self.downloader_task("single", [item], self.settings.value('Path'))
 
-    def trackprogress(self, num: int):
-        self.current += num
+    def trackprogress(self, tab: str, done: int, total: int):
+        if tab == "bulk":
+            self.ui.bulk_dl.setText(f"Downloading... {done}/{total}")
+
+    def track_transfer(self, tab: str, snapshot: dict):
+        if tab == "bulk":
+            self.bulk_transfer(snapshot)
+        else:
+            self.single_transfer(snapshot)
+
+    def download_finished(self, tab: str):
+        if tab == "bulk":
+            self.enable_bulk_dl_btn()
+        else:
+            self.enable_single_dl_btn()
+
+    def transfer_text(self, snapshot: dict) -> str:
+        text: str = f"{snapshot['done']}/{snapshot['total']}"
+        if snapshot['rate']:
+            text += f" · {human_bytes(snapshot['rate'])}/s"
+        if snapshot['eta'] is not None:
+            text += f" · {human_duration(snapshot['eta'])} left"
+        return text
+
+    def transfer_tooltip(self, snapshot: dict) -> str:
+        lines: list = []
+        for track in snapshot['tracks']:
+            if track['stage'] == "transcoding" and track['duration']:
+                lines.append(f"{track['title']}: converting {min(track['encoded'] / track['duration'], 1):.0%}")
+            elif track['size']:
+                lines.append(f"{track['title']}: {track['received'] / track['size']:.0%} of {human_bytes(track['size'])}")
+            else:
+                lines.append(f"{track['title']}: {human_bytes(track['received'])}")
+        return "\n".join(lines)
+
+    def bulk_transfer(self, snapshot: dict):
+        self.ui.bulk_dl.setText(f"Downloading... {self.transfer_text(snapshot)}")
+        self.ui.bulk_dl.setToolTip(self.transfer_tooltip(snapshot))
+
+    def single_transfer(self, snapshot: dict):
+        track: dict | None = snapshot['tracks'][0] if len(snapshot['tracks']) == 1 else None
+        if track is not None and track['stage'] == "transcoding" and track['duration']:
+            text: str = f"Converting... {min(track['encoded'] / track['duration'], 1):.0%}"
+        elif track is not None and track['size'] and snapshot['total'] <= 1:
+            text: str = f"Downloading... {track['received'] / track['size']:.0%}"
+        else:
+            text: str = f"Downloading... {self.transfer_text(snapshot)}"
+        self.ui.single_dl_btn.setText(text)
 
     def enable_single_dl_btn(self):
         self.ui.single_dl_btn.setEnabled(True)
@@ -324,10 +625,10 @@ class MainWindow(QMainWindow):
         self.ui.single_input.clear()
 
     def enable_bulk_dl_btn(self):
-        if self.current == self.expected:
-            self.ui.bulk_dl.setEnabled(True)
-            self.ui.clear_dl.setEnabled(True)
-            self.ui.bulk_dl.setText("Download All")
+        self.ui.bulk_dl.setEnabled(True)
+        self.ui.clear_dl.setEnabled(True)
+        self.ui.bulk_dl.setText("Download All")
+        self.ui.bulk_dl.setToolTip("")
 
     @pyqtSlot()
     def on_folder_browse_btn_clicked(self):
@@ -341,6 +642,25 @@ class MainWindow(QMainWindow):
     def on_clear_search_clicked(self):
         self.ui.search_bar.clear()
 
+    def closeEvent(self, event):
+        self.title_fetcher.shutdown()
+        # nothing new is queued, the window waits only so long for the pools to wind down, transfers still running
+        # end behind it before the process exits and the journal resumes whatever they left half done
+        self.worker.stop()
+        self.thread.join(CLOSE_TIMEOUT)
+        if self.thread.is_alive():
+            logging.warning(f"Downloads still running after {CLOSE_TIMEOUT:.0f}s, leaving them for the next start")
+        super().closeEvent(event)
+
+    def failures_modal(self, failures: list):
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Warning)
+        msg.setText(f"{len(failures)} track(s) could not be downloaded, even after retrying")
+        msg.setInformativeText("Everything else finished. Downloading the same items again only fetches these.")
+        msg.setDetailedText("\n".join(f"{failure['url']}\n    {failure['message']}" for failure in failures))
+        msg.setWindowTitle("Download errors")
+        msg.exec_()
+
     def error_modal(self, e=None):
         msg = QMessageBox()
         msg.setIcon(QMessageBox.Critical)
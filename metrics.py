@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import threading
+import contextlib
+from bisect import bisect_left
+
+PREFIX = "ytmusic_dl"
+# seconds, wide enough for a cached lookup at one end and a long ffmpeg encode at the other
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+COUNTERS = {
+    'bytes': "Bytes received from stream urls.",
+    'tracks': "Track attempts finished, by result, a retried track counts once per attempt.",
+    'failures': "Stage runs that raised, by stage.",
+    'retries': "Fallbacks taken after a failed attempt, by reason.",
+    'cache': "Metadata cache lookups by result, expired counts manifests dropped after the origin refused their urls.",
+    'pools': "Track worker pools started.",
+    'pruned': "Files deleted because their track left a synced playlist.",
+    'linked': "Tracks placed from another library folder instead of downloaded, by method.",
+    'browser_launches': "Headless chromium launches.",
+    'swept': "Temp files left by crashed runs deleted from the folders a job touched.",
+    'browser_pages': "Playlists enumerated in chromium, those beyond the launches reused a running browser.",
+}
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS) -> None:
+        self.buckets: tuple = buckets
+        self.counts: list = [0] * len(buckets)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            self.counts[index] += 1
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self) -> list:
+        total, result = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'mean': round(self.sum / self.count, 6) if self.count else 0,
+            'buckets': {str(bound): count for bound, count in self.cumulative()},
+        }
+
+
+def _value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _labels(labels: tuple) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in labels)
+
+
+class Metrics:
+    """ stage timings and counters for one run, dumped as json or prometheus text """
+    def __init__(self) -> None:
+        self.lock: threading.Lock = threading.Lock()
+        self.stages: dict = {}
+        self.counters: dict = {}
+        self.created: float = time.time()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def add(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def seconds(self, stage: str) -> float:
+        with self.lock:
+            histogram = self.stages.get(stage)
+            return histogram.sum if histogram is not None else 0.0
+
+    def total(self, name: str) -> float:
+        """ a counter summed over all its labels """
+        with self.lock:
+            return sum(value for (key, _), value in self.counters.items() if key == name)
+
+    @contextlib.contextmanager
+    def timer(self, stage: str):
+        """ time the block as ``stage`` and count it as a failure if it raises """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.add('failures', stage=stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def merge(self, other: "Metrics") -> None:
+        with other.lock:
+            stages = {stage: histogram for stage, histogram in other.stages.items()}
+            counters = dict(other.counters)
+        with self.lock:
+            for stage, histogram in stages.items():
+                self.stages.setdefault(stage, Histogram(histogram.buckets)).merge(histogram)
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                'created': self.created,
+                'stages': {stage: histogram.to_dict() for stage, histogram in sorted(self.stages.items())},
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items())],
+            }
+
+    def prometheus(self) -> str:
+        """ text exposition format, one histogram for the stages and one counter per name """
+        lines: list = []
+        with self.lock:
+            if self.stages:
+                name = f"{PREFIX}_stage_seconds"
+                lines += [f"# HELP {name} Time spent in each pipeline stage.", f"# TYPE {name} histogram"]
+                for stage, histogram in sorted(self.stages.items()):
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+            names = sorted({name for name, _ in self.counters})
+            for counter in names:
+                name = f"{PREFIX}_{counter}_total"
+                lines += [f"# HELP {name} {COUNTERS.get(counter, counter)}", f"# TYPE {name} counter"]
+                for (key, labels), value in sorted(self.counters.items()):
+                    if key == counter:
+                        lines.append(f"{name}{{{_labels(labels)}}} {_value(value)}" if labels else f"{name} {_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """ json for a .json path, prometheus text otherwise, replaced atomically for scrapers """
+        text = json.dumps(self.to_dict(), indent=2) if path.endswith(".json") else self.prometheus()
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
@@ -0,0 +1,170 @@
+import io
+import os
+import json
+import socket
+import asyncio
+import threading
+import contextlib
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+
+# one pool serves every transfer in the process, http/2 multiplexes most of them over a handful of sockets
+MAX_CONNECTIONS = 200
+MAX_KEEPALIVE = 50
+KEEPALIVE_EXPIRY = 30.0
+DEFAULT_TIMEOUT = 30.0
+CHUNK_SIZE = 256 * 1024
+# threads shared by every transfer for blocking file writes, the loop only ever waits on them
+WRITER_THREADS = 4
+
+
+def timeout_for(seconds: float | None) -> httpx.Timeout:
+    # waiting for a free connection is queueing, not a stalled server, so the pool wait is unbounded
+    return httpx.Timeout(seconds or DEFAULT_TIMEOUT, pool=None)
+
+
+class NetCore:
+    """ one event loop thread and the keep-alive clients shared by every request in the process, ``client`` for
+    api and page requests and ``media`` for stream bodies """
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, http2: bool = True, writers: int = WRITER_THREADS) -> None:
+        self.max_connections: int = max_connections
+        self.http2: bool = http2
+        self.writers: int = writers
+        self.pid: int = os.getpid()
+        self.lock: threading.Lock = threading.Lock()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.client: httpx.AsyncClient | None = None
+        self.media: httpx.AsyncClient | None = None
+        self.writer: ThreadPoolExecutor | None = None
+
+    def start(self) -> None:
+        with self.lock:
+            if self.loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(target=loop.run_forever, name="netcore", daemon=True)
+            self.thread.start()
+            # made on the loop so their pools belong to it, and before anyone else sees the loop
+            self.client = asyncio.run_coroutine_threadsafe(self.open_client(self.http2), loop).result()
+            # http/2 would put every range of a track on one socket, the point of segments is separate ones
+            self.media = asyncio.run_coroutine_threadsafe(self.open_client(False), loop).result()
+            self.writer = ThreadPoolExecutor(self.writers, thread_name_prefix="netcore-writer")
+            self.loop = loop
+
+    async def open_client(self, http2: bool) -> httpx.AsyncClient:
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=MAX_KEEPALIVE,
+                              keepalive_expiry=KEEPALIVE_EXPIRY)
+        return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout_for(None), follow_redirects=True)
+
+    async def write(self, fn, *args):
+        """ run blocking file work on the shared writer threads and wait for it without holding up the loop """
+        return await asyncio.get_running_loop().run_in_executor(self.writer, fn, *args)
+
+    def run(self, coro):
+        """ run a coroutine on the loop and wait for it from a plain thread """
+        if self.loop is None:
+            self.start()
+        if threading.current_thread() is self.thread:
+            coro.close()
+            raise RuntimeError("NetCore.run called from its own loop, await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def fetch(self, method: str, url: str, headers: dict | None = None, content: bytes | None = None,
+                    timeout: float | None = None) -> httpx.Response:
+        return await self.client.request(method, url, headers=headers, content=content, timeout=timeout_for(timeout))
+
+    def request(self, method: str, url: str, headers: dict | None = None, content: bytes | None = None,
+                timeout: float | None = None) -> httpx.Response:
+        """ a whole response, body read """
+        return self.run(self.fetch(method, url, headers, content, timeout))
+
+    def get(self, url: str, headers: dict | None = None, timeout: float | None = None) -> httpx.Response:
+        return self.request("GET", url, headers, timeout=timeout)
+
+    @contextlib.contextmanager
+    def stream(self, url: str, headers: dict | None = None, timeout: float | None = None, media: bool = False):
+        """ a response whose body is left on the socket until chunks() asks for it """
+        if self.loop is None:
+            self.start()
+        client = self.media if media else self.client
+        context = client.stream("GET", url, headers=headers, timeout=timeout_for(timeout))
+        response = self.run(context.__aenter__())
+        try:
+            yield response
+        finally:
+            self.run(context.__aexit__(None, None, None))
+
+    def chunks(self, response: httpx.Response, chunk_size: int = CHUNK_SIZE):
+        """ body chunks read on the loop one at a time, so a slow consumer like an ffmpeg pipe holds back the socket """
+        body = response.aiter_bytes(chunk_size)
+
+        async def next_chunk():
+            return await body.__anext__()
+        while True:
+            try:
+                yield self.run(next_chunk())
+            except StopAsyncIteration:
+                return
+
+    def close(self) -> None:
+        with self.lock:
+            loop, self.loop = self.loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.client.aclose(), loop).result()
+        asyncio.run_coroutine_threadsafe(self.media.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self.thread.join()
+        loop.close()
+        self.writer.shutdown(wait=True)
+
+
+_core: NetCore | None = None
+_core_lock: threading.Lock = threading.Lock()
+
+
+def shared() -> NetCore:
+    """ the process wide core, a forked child starts its own """
+    global _core
+    with _core_lock:
+        if _core is None or _core.pid != os.getpid():
+            _core = NetCore()
+        return _core
+
+
+class PytubeResponse:
+    """ the parts of an urlopen response pytube reads """
+    def __init__(self, response: httpx.Response) -> None:
+        self.response: httpx.Response = response
+        self.body: io.BytesIO = io.BytesIO(response.content)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.body.read(size)
+
+    def info(self) -> httpx.Headers:
+        return self.response.headers
+
+
+def pytube_request(url, method=None, headers=None, data=None, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+    """ stands in for pytube.request._execute_request, same arguments and errors but over the shared pool """
+    base_headers = {"User-Agent": "Mozilla/5.0", "accept-language": "en-US,en"}
+    if headers:
+        base_headers.update(headers)
+    if data and not isinstance(data, bytes):
+        data = bytes(json.dumps(data), encoding="utf-8")
+    if not url.lower().startswith("http"):
+        raise ValueError("Invalid URL")
+    seconds = None if timeout is socket._GLOBAL_DEFAULT_TIMEOUT else timeout
+    response = shared().request(method or ("POST" if data else "GET"), url, base_headers, data, seconds)
+    if response.status_code >= 400:
+        # pytube and the throttle handling both look for urllib's error and its code
+        raise urllib.error.HTTPError(url, response.status_code, response.reason_phrase, response.headers, None)
+    return PytubeResponse(response)
+
+
+def route_pytube() -> None:
+    """ send pytube's metadata and player requests through the shared pool instead of a fresh urlopen each """
+    import pytube.request
+    pytube.request._execute_request = pytube_request
@@ -0,0 +1,69 @@
+from dataclasses import dataclass, replace
+
+# container each source codec lands in when it is copied without re-encoding
+COPY_EXTENSIONS = {
+    'opus': 'opus',
+    'mp4a': 'm4a',
+    'aac': 'm4a',
+    'mp3': 'mp3',
+    'vorbis': 'ogg',
+}
+OUTPUT_EXTENSIONS = ('.mp3', '.opus', '.m4a', '.ogg')
+
+
+def codec_family(codec: str | None) -> str:
+    """ 'mp4a.40.2' -> 'mp4a', 'opus' -> 'opus' """
+    return (codec or "").split('.')[0].lower()
+
+
+@dataclass(frozen=True)
+class OutputProfile:
+    name: str
+    extension: str
+    encoder: str | None = None
+    bitrate: int = 0
+    sample_rate: int = 0
+    copy_codecs: tuple = ()
+
+    @property
+    def key(self) -> str:
+        """ identifies the output a profile produces, so files are only reused for the same settings """
+        return f"{self.name}:{self.bitrate}"
+
+    def can_copy(self, source_codec: str | None) -> bool:
+        family = codec_family(source_codec)
+        if self.encoder is None:
+            return family in COPY_EXTENSIONS
+        return family in self.copy_codecs
+
+    def extension_for(self, source_codec: str | None) -> str:
+        if self.encoder is None:
+            return COPY_EXTENSIONS.get(codec_family(source_codec), 'mka')
+        return self.extension
+
+    def ffmpeg_args(self, source_codec: str | None) -> list:
+        if self.can_copy(source_codec) or self.encoder is None:
+            return ["-vn", "-c:a", "copy"]
+        args = ["-vn", "-c:a", self.encoder, "-b:a", "%dk"%self.bitrate]
+        if self.sample_rate:
+            args += ["-ar", "%d"%self.sample_rate]
+        return args
+
+
+PROFILES = {
+    'mp3': OutputProfile('mp3', 'mp3', 'libmp3lame', 320, 44100, ('mp3',)),
+    'opus': OutputProfile('opus', 'opus', 'libopus', 160, 0, ('opus',)),
+    'm4a': OutputProfile('m4a', 'm4a', 'aac', 256, 0, ('mp4a', 'aac')),
+    'source': OutputProfile('source', 'mka'),
+}
+DEFAULT_PROFILE = PROFILES['mp3']
+
+
+def get_profile(name: str = 'mp3', bitrate: int | None = None) -> OutputProfile:
+    """ look up a profile by name, optionally overriding its bitrate """
+    if name not in PROFILES:
+        raise ValueError(f"Unknown output profile '{name}', expected one of {', '.join(PROFILES)}")
+    profile = PROFILES[name]
+    if bitrate:
+        profile = replace(profile, bitrate=bitrate)
+    return profile
@@ -0,0 +1,111 @@
+import time
+import threading
+
+DEFAULT_INTERVAL = 0.25
+# weight of the newest sample in the smoothed transfer rate
+SMOOTHING = 0.3
+
+FETCHING = "fetching"
+TRANSCODING = "transcoding"
+
+
+def human_bytes(count: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if count < 1024 or unit == "GB":
+            return f"{count:.1f} {unit}" if unit != "B" else f"{int(count)} B"
+        count /= 1024
+
+
+def human_duration(seconds: float | None) -> str:
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class ProgressTracker:
+    """ per track byte and transcode progress shared by the worker threads, reported at most every ``interval`` seconds """
+    def __init__(self, callback, interval: float = DEFAULT_INTERVAL) -> None:
+        self.callback = callback
+        self.interval: float = interval
+        self.lock: threading.Lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.tracks: dict = {}
+            self.done: int = 0
+            self.total: int = 0
+            self.bytes: int = 0
+            self.started: float = time.monotonic()
+            self.last_emit: float = 0.0
+            self.last_bytes: int = 0
+            self.rate: float = 0.0
+
+    def expect(self, total: int) -> None:
+        with self.lock:
+            self.total = total
+
+    def begin(self, key: str, title: str, size: int | None = None, duration: float | None = None) -> None:
+        with self.lock:
+            # received stays None until the first report, which may be a resumed offset rather than new bytes
+            self.tracks[key] = {'title': title, 'stage': FETCHING, 'received': None, 'size': size,
+                                'encoded': 0.0, 'duration': duration}
+        self.maybe_emit()
+
+    def transferred(self, key: str, received: int) -> None:
+        with self.lock:
+            track = self.tracks.get(key)
+            if track is None:
+                return
+            if track['received'] is not None:
+                self.bytes += max(received - track['received'], 0)
+            track['received'] = received
+        self.maybe_emit()
+
+    def transcoded(self, key: str, seconds: float) -> None:
+        with self.lock:
+            track = self.tracks.get(key)
+            if track is None:
+                return
+            track['stage'] = TRANSCODING
+            track['encoded'] = seconds
+        self.maybe_emit()
+
+    def end(self, key: str, done: int, total: int) -> None:
+        with self.lock:
+            self.tracks.pop(key, None)
+            self.done, self.total = done, total
+        self.maybe_emit(force=done >= total)
+
+    def snapshot(self) -> dict:
+        """ counts, smoothed rate and eta plus the tracks still in flight, call with the lock held """
+        now = time.monotonic()
+        elapsed = now - self.last_emit if self.last_emit else now - self.started
+        if elapsed > 0:
+            sample = (self.bytes - self.last_bytes) / elapsed
+            self.rate = sample if not self.last_emit else SMOOTHING * sample + (1 - SMOOTHING) * self.rate
+        self.last_emit, self.last_bytes = now, self.bytes
+        eta: float | None = None
+        if self.done and self.total > self.done:
+            eta = (now - self.started) / self.done * (self.total - self.done)
+        elif self.rate > 0:
+            remaining = sum(track['size'] - (track['received'] or 0) for track in self.tracks.values() if track['size'])
+            if remaining > 0:
+                eta = remaining / self.rate
+        return {
+            'done': self.done,
+            'total': self.total,
+            'bytes': self.bytes,
+            'rate': round(self.rate),
+            'eta': round(eta) if eta is not None else None,
+            'tracks': [dict(track, url=key, received=track['received'] or 0) for key, track in self.tracks.items()],
+        }
+
+    def maybe_emit(self, force: bool = False) -> None:
+        with self.lock:
+            if not force and time.monotonic() - self.last_emit < self.interval:
+                return
+            snapshot = self.snapshot()
+        self.callback(snapshot)
@@ -0,0 +1,45 @@
+import os
+import json
+import time
+
+# rounds of re-queueing only the failed tracks after the first pass
+DEFAULT_RETRIES = 2
+
+
+class JobReport:
+    """ the last outcome of every track in a job, so a rerun only needs the failures """
+    def __init__(self) -> None:
+        self.started: float = time.time()
+        # (url, output path) -> latest result, the same video can go to several folders
+        self.tracks: dict = {}
+        self.retried: int = 0
+        # one entry per synced playlist: how many tracks it has, how many were new, removed and pruned
+        self.synced: list = []
+
+    def add(self, url: str, output_path: str, result: tuple, item: str = "") -> None:
+        entry = self.tracks.get((url, output_path))
+        attempts = entry['attempts'] + 1 if entry is not None else 1
+        self.tracks[(url, output_path)] = {'url': url, 'output': output_path, 'item': item, 'ok': result[1],
+                                           'message': result[2], 'attempts': attempts}
+
+    @property
+    def results(self) -> list:
+        return [(entry['url'], entry['ok'], entry['message']) for entry in self.tracks.values()]
+
+    @property
+    def failures(self) -> list:
+        return [entry for entry in self.tracks.values() if not entry['ok']]
+
+    def to_dict(self) -> dict:
+        failures = self.failures
+        return {
+            'started': round(self.started, 3), 'finished': round(time.time(), 3),
+            'tracks': len(self.tracks), 'succeeded': len(self.tracks) - len(failures), 'failed': len(failures),
+            'retried': self.retried, 'synced': self.synced, 'failures': failures,
+        }
+
+    def write(self, path: str) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp, path)
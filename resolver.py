@@ -0,0 +1,293 @@
+import re
+import json
+import logging
+from html import unescape
+from throttle import is_throttled
+from netcore import (
+    NetCore,
+    shared)
+from dataclasses import dataclass, field
+from urllib.parse import (
+    urlparse,
+    parse_qs)
+
+PLAYLIST_URL = "https://www.youtube.com/playlist?list={}"
+WATCH_URL = "https://www.youtube.com/watch?v={}"
+BROWSE_URL = "https://www.youtube.com/youtubei/v1/browse?key={}&prettyPrint=false"
+# playlists stop at 5000 videos, 100 per page
+MAX_PAGES = 50
+MAX_TRACK_SECONDS = 900
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+# skips the EU consent interstitial that otherwise replaces the page data
+COOKIES = {'CONSENT': 'YES+cb', 'SOCS': 'CAI'}
+# sent per request as a header, the shared client also serves stream urls on other hosts
+REQUEST_HEADERS = dict(HEADERS, Cookie="; ".join(f"{key}={value}" for key, value in COOKIES.items()))
+INITIAL_DATA = re.compile(r'(?:var\s+ytInitialData|window\["ytInitialData"\])\s*=\s*')
+INNERTUBE_KEY = re.compile(r'"INNERTUBE_API_KEY"\s*:\s*"([^"]+)"')
+INNERTUBE_VERSION = re.compile(r'"INNERTUBE_CLIENT_VERSION"\s*:\s*"([^"]+)"')
+TITLE = re.compile(rb'<title[^>]*>(.*?)</title>', re.S | re.I)
+TITLE_LIMIT = 256 * 1024
+
+
+def safe_name(name: str) -> str:
+    return name.replace('?','').replace('/', '').replace(',','').replace('*','').replace('|', '').replace('"','').strip()
+
+
+@dataclass
+class Track:
+    id: str
+    title: str
+    duration: int = 0
+
+    @property
+    def url(self) -> str:
+        return WATCH_URL.format(self.id)
+
+
+@dataclass
+class Playlist:
+    id: str
+    title: str
+    artist: str = ""
+    tracks: list = field(default_factory=list)
+    # token for the next page of tracks, left set when a later page could not be fetched
+    continuation: str = ""
+
+    @property
+    def complete(self) -> bool:
+        return not self.continuation
+
+    @property
+    def album_name(self) -> str:
+        if self.artist:
+            return safe_name(f"{self.artist} - {self.title}")
+        return safe_name(self.title)
+
+    @property
+    def urls(self) -> list:
+        return [track.url for track in self.tracks]
+
+
+def parse_item(text: str) -> dict:
+    """ queue item for a watch/playlist url, a youtu.be link or a bare id """
+    text = text.strip()
+    if not text.startswith("http"):
+        if not re.fullmatch(r'[\w-]{11,}', text):
+            raise ValueError(f"Not a video or playlist id: {text}")
+        return {'id': text, 'type': "playlist" if len(text) > 11 else "single"}
+    url = urlparse(text)
+    query = parse_qs(url.query)
+    if url.netloc.endswith("youtu.be") and url.path.strip('/'):
+        return {'id': url.path.strip('/'), 'type': "single"}
+    if 'v' in query:
+        return {'id': query['v'][0], 'type': "single"}
+    if 'list' in query:
+        return {'id': query['list'][0], 'type': "playlist"}
+    raise ValueError(f"Not a video or playlist url: {text}")
+
+
+def parse_items(text: str) -> tuple:
+    """ queue items from newline separated urls or ids deduplicated by id, plus the lines that did not parse """
+    items: list = []
+    invalid: list = []
+    seen: set = set()
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            item = parse_item(line)
+        except ValueError:
+            invalid.append(line)
+            continue
+        if item['id'] not in seen:
+            seen.add(item['id'])
+            items.append(item)
+    return items, invalid
+
+
+def item_url(item: dict) -> str:
+    return PLAYLIST_URL.format(item['id']) if item['type'] == "playlist" else WATCH_URL.format(item['id'])
+
+
+def extract_initial_data(html: str) -> dict | None:
+    """ pull the ytInitialData object embedded in a youtube page """
+    match = INITIAL_DATA.search(html)
+    if match is None:
+        return None
+    try:
+        data, _ = json.JSONDecoder().raw_decode(html, match.end())
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _walk(node, key: str):
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == key:
+                yield v
+            else:
+                yield from _walk(v, key)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _walk(item, key)
+
+
+def _text(node) -> str:
+    if isinstance(node, str):
+        return node
+    if not isinstance(node, dict):
+        return ""
+    if 'simpleText' in node:
+        return node['simpleText']
+    if 'runs' in node:
+        return "".join(run.get('text', '') for run in node['runs'])
+    if 'content' in node:
+        return node['content']
+    return ""
+
+
+def _header(data: dict) -> tuple:
+    """ album title and artist from either the classic or the view-model playlist header """
+    title: str = ""
+    artist: str = ""
+    for header in _walk(data, 'playlistHeaderRenderer'):
+        title = _text(header.get('title'))
+        artist = _text(header.get('ownerText'))
+        break
+    if not title:
+        for header in _walk(data, 'pageHeaderRenderer'):
+            title = header.get('pageTitle', "")
+            break
+    if not title:
+        for micro in _walk(data, 'microformatDataRenderer'):
+            title = micro.get('title', "")
+            break
+    for part in _walk(data, 'metadataParts'):
+        texts = [_text(p.get('text')) for p in part if isinstance(p, dict)]
+        if any("Album" in t for t in texts):
+            artist = next((t for t in texts if t and "Album" not in t and not t.strip().isdigit()), artist)
+            break
+    if title.startswith("Album - "):
+        title = title[len("Album - "):]
+    artist = re.sub(r"\s+-\s+Topic$", "", artist).strip()
+    return title.strip(), artist
+
+
+def _tracks(data) -> list:
+    tracks: list = []
+    for renderer in _walk(data, 'playlistVideoRenderer'):
+        video_id = renderer.get('videoId')
+        if not video_id or renderer.get('isPlayable') is False:
+            continue
+        try:
+            duration = int(renderer.get('lengthSeconds') or 0)
+        except ValueError:
+            duration = 0
+        if duration >= MAX_TRACK_SECONDS:
+            continue
+        tracks.append(Track(video_id, _text(renderer.get('title')), duration))
+    return tracks
+
+
+def _continuation(data) -> str:
+    for renderer in _walk(data, 'continuationItemRenderer'):
+        token = renderer.get('continuationEndpoint', {}).get('continuationCommand', {}).get('token')
+        if token:
+            return token
+    return ""
+
+
+def parse_playlist(html: str, playlist_id: str) -> Playlist | None:
+    """ build a Playlist from a saved or fetched playlist page, None when the page data is unusable """
+    data = extract_initial_data(html)
+    if data is None:
+        return None
+    tracks = _tracks(data)
+    if not tracks:
+        return None
+    title, artist = _header(data)
+    return Playlist(playlist_id, title or playlist_id, artist, tracks, _continuation(data))
+
+
+def parse_continuation(data: dict) -> tuple:
+    """ tracks and the token for the page after them from a browse continuation response """
+    return _tracks(data), _continuation(data)
+
+
+class TitleResolver:
+    """ read page titles over the shared keep-alive pool, stopping at the end of <title> instead of parsing the page """
+    def __init__(self, core: NetCore | None = None, timeout: int = 10) -> None:
+        self.core: NetCore = core or shared()
+        self.timeout: int = timeout
+
+    def title(self, item: dict) -> str:
+        head: bytes = b""
+        with self.core.stream(item_url(item), headers=REQUEST_HEADERS, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for chunk in self.core.chunks(response, 16 * 1024):
+                head += chunk
+                match = TITLE.search(head)
+                if match is not None:
+                    return unescape(match.group(1).decode(response.encoding or 'utf-8', errors='replace')).strip()
+                if len(head) > TITLE_LIMIT:
+                    break
+        raise ValueError(f"No title found for {item['id']}")
+
+
+class PlaylistResolver:
+    """ resolve playlists over plain http without a browser """
+    def __init__(self, core: NetCore | None = None, timeout: int = 10) -> None:
+        self.core: NetCore = core or shared()
+        self.timeout: int = timeout
+
+    def fetch(self, playlist_id: str) -> str:
+        response = self.core.get(PLAYLIST_URL.format(playlist_id), headers=REQUEST_HEADERS, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def fetch_continuation(self, token: str, key: str, version: str) -> dict:
+        body = {'context': {'client': {'clientName': "WEB", 'clientVersion': version, 'hl': "en"}}, 'continuation': token}
+        response = self.core.request("POST", BROWSE_URL.format(key), dict(REQUEST_HEADERS, **{'Content-Type': "application/json"}),
+                                     json.dumps(body).encode(), self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def follow(self, playlist: Playlist, html: str) -> None:
+        """ append the pages after the first, a page that fails leaves the playlist marked incomplete """
+        if not playlist.continuation:
+            return
+        key, version = INNERTUBE_KEY.search(html), INNERTUBE_VERSION.search(html)
+        if key is None or version is None:
+            logging.error(f"Playlist {playlist.id} has more pages but the page carries no api key to fetch them")
+            return
+        for _ in range(MAX_PAGES):
+            if not playlist.continuation:
+                return
+            try:
+                tracks, token = parse_continuation(self.fetch_continuation(playlist.continuation, key.group(1), version.group(1)))
+            except Exception as e:
+                if is_throttled(e):
+                    raise
+                logging.exception(f"Playlist {playlist.id} stopped after {len(playlist.tracks)} tracks: {e}")
+                return
+            playlist.tracks.extend(tracks)
+            playlist.continuation = token
+
+    def resolve(self, playlist_id: str) -> Playlist | None:
+        try:
+            html = self.fetch(playlist_id)
+            playlist = parse_playlist(html, playlist_id)
+        except Exception as e:
+            if is_throttled(e):
+                # chromium would be turned away just the same, let the caller back off instead
+                raise
+            logging.exception(f"Playlist {playlist_id} could not be resolved over http: {e}")
+            return None
+        if playlist is not None:
+            self.follow(playlist, html)
+        return playlist
@@ -0,0 +1,409 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from downloader import (
+    Base,
+    BrowserPool,
+    Downloader)
+from profiles import OutputProfile
+from progress import ProgressTracker
+from metrics import Metrics
+from dedup import FileIndex
+from tempfiles import (
+    discard,
+    sweep_orphans)
+from throttle import ConcurrencyController
+from resolver import item_url
+from report import (
+    JobReport,
+    DEFAULT_RETRIES)
+from cache import MetadataCache
+from sync import Manifest
+from journal import (
+    Journal,
+    PENDING,
+    FETCHED,
+    TRANSCODED,
+    DONE,
+    FAILED)
+
+DEFAULT_FETCH_WORKERS = 10
+DEFAULT_TRANSCODE_WORKERS = max((os.cpu_count() or 2) - 1, 1)
+# fetches allowed in flight before the controller has seen any throughput
+INITIAL_FETCHES = 4
+
+
+@dataclass
+class TrackJob:
+    video_id: str
+    output_path: str
+    kind: str = "single"
+    item_id: str = ""
+    # the job's own source file once a fetch has started, kept so a retry or the next run resumes it
+    source: str | None = None
+
+    @property
+    def url(self) -> str:
+        return f"https://www.youtube.com/watch?v={self.video_id}"
+
+
+class Scheduler(Base):
+    """ flatten queued singles and playlists into track jobs and pipe them through separate fetch and transcode pools """
+    def __init__(self, path: str, fetch_workers: int = DEFAULT_FETCH_WORKERS,
+                 transcode_workers: int = DEFAULT_TRANSCODE_WORKERS, queue_size: int | None = None,
+                 stream: bool = False, profile: OutputProfile | None = None, connections: int = 4,
+                 cache: MetadataCache | None = None, journal: Journal | None = None, on_job_done=None,
+                 progress: ProgressTracker | None = None, retries: int = DEFAULT_RETRIES, sync: bool = False,
+                 prune: bool = False) -> None:
+        super().__init__(stream, profile, connections, cache, progress)
+        self.path: str = path
+        self.journal: Journal | None = journal
+        self.fetch_workers: int = fetch_workers
+        # fetch_workers is the ceiling, the controller decides how many of them hit the origin at once
+        self.limiter = ConcurrencyController(min(INITIAL_FETCHES, fetch_workers), maximum=fetch_workers)
+        self.transcode_workers: int = transcode_workers
+        self.fetched: queue.Queue = queue.Queue(maxsize=queue_size or transcode_workers * 2)
+        self.on_job_done = on_job_done
+        self.retries: int = retries
+        # playlists only queue tracks their manifest does not have yet, prune deletes the ones they dropped
+        self.sync: bool = sync
+        self.prune: bool = prune
+        # playlist id -> (manifest, album folder) for the run
+        self.manifests: dict = {}
+        self.total: int = 0
+        self.done: int = 0
+        # failed jobs of the current round, queued again once it drains
+        self.failed: list = []
+        # video id -> jobs for the same track held back until the first copy is on disk
+        self.claimed: dict = {}
+        self.lock: threading.Lock = threading.Lock()
+        self.idle: threading.Condition = threading.Condition(self.lock)
+        self.cancelled: bool = False
+        self.started: bool = False
+        # items waiting to be expanded, add() feeds more in while a run is taking them
+        self.incoming: deque = deque()
+        self.running: bool = False
+        # item id -> its tracks not finished yet this round, on_item_done hears when one reaches zero
+        self.outstanding: dict = {}
+        self.on_item_done = None
+        # item id -> jobs not handed to a fetch worker yet, taken round robin so an item queued late is not stuck
+        # behind every track of one queued earlier, the executor only ever holds as many jobs as it has workers
+        self.ready: dict = {}
+        self.in_flight: int = 0
+
+    def expand(self, item: dict, downloader: Downloader) -> list:
+        """ track jobs for a queued item, each paired with the journal row it resumes from """
+        syncing: bool = (self.sync or self.prune) and item['type'] == "playlist"
+        if self.journal is not None:
+            rows = self.journal.tracks(item['id'], self.path)
+            if rows is not None:
+                if syncing and rows:
+                    # an interrupted sync picks up its recorded tracks, the manifest still learns about them
+                    self.manifests[item['id']] = (Manifest.for_playlist(self.path, item['id']), rows[0]['output_path'])
+                return [(TrackJob(row['video_id'], row['output_path'], row['kind'], item['id']), row) for row in rows]
+        if item['type'] == "single":
+            jobs = [TrackJob(item['id'], f"{self.path}/", "single", item['id'])]
+        else:
+            albumName, urls, complete = self.retrying(lambda: downloader.resolve(item['id']))
+            album_path = f"{self.path}/{albumName}"
+            self.create_directory(album_path)
+            self.metrics.add('swept', sweep_orphans(album_path, recursive=False))
+            if syncing:
+                manifest = Manifest.for_playlist(self.path, item['id'])
+                with self.lock:
+                    urls = self.plan_sync(manifest, urls, album_path, self.prune, complete)
+                self.manifests[item['id']] = (manifest, album_path)
+            jobs = [TrackJob(url.split("v=")[1].split("&")[0], album_path, "playlist", item['id']) for url in urls]
+        if self.journal is not None:
+            self.journal.record_tracks(item['id'], self.path, jobs)
+        return [(job, None) for job in jobs]
+
+    def record(self, job: TrackJob, state: str, **fields) -> None:
+        if self.journal is not None:
+            self.journal.set_state(job, state, **fields)
+
+    def finish(self, job: TrackJob, result: tuple) -> None:
+        self.record(job, DONE if result[1] else FAILED, message=result[2])
+        self.metrics.add('tracks', result="ok" if result[1] else "failed")
+        with self.lock:
+            self.report.add(job.url, job.output_path, result, job.item_id)
+            if not result[1] and not self.cancelled:
+                self.failed.append(job)
+            self.done += 1
+            left = self.outstanding.get(job.item_id, 0) - 1
+            if left > 0:
+                self.outstanding[job.item_id] = left
+            else:
+                self.outstanding.pop(job.item_id, None)
+                if self.on_item_done is not None:
+                    self.on_item_done(job.item_id)
+            if self.on_job_done is not None:
+                self.on_job_done(job, result, self.done, self.total)
+            if self.progress is not None:
+                self.progress.end(job.url, self.done, self.total)
+            waiting = self.claimed.pop(job.video_id, None)
+            self.idle.notify_all()
+        for other in waiting or []:
+            self.dispatch(other)
+
+    def dispatch(self, job: TrackJob) -> None:
+        with self.lock:
+            self.ready.setdefault(job.item_id, deque()).append(job)
+        self.pump()
+
+    def pump(self) -> None:
+        """ fill the free fetch workers one job per item in turn """
+        while True:
+            with self.lock:
+                if self.in_flight >= self.fetch_workers or not self.ready:
+                    return
+                item_id = next(iter(self.ready))
+                jobs: deque = self.ready.pop(item_id)
+                job: TrackJob = jobs.popleft()
+                if jobs:
+                    # back of the line until every other item has had a turn
+                    self.ready[item_id] = jobs
+                self.in_flight += 1
+            self.fetchers.submit(self.take, job)
+
+    def take(self, job: TrackJob) -> None:
+        try:
+            self.fetch(job)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            self.pump()
+
+    def fetch(self, job: TrackJob) -> None:
+        if self.cancelled:
+            self.finish(job, (job.url, False, "Cancelled"))
+            return
+        try:
+            linked = self.link_existing(job.url, job.output_path, with_artist=job.kind == "single")
+        except Exception as e:
+            logging.exception(f"Could not reuse an existing copy of {job.url}: {e}")
+            linked = None
+        if linked is not None:
+            dest, title = linked
+            self.record(job, TRANSCODED, dest=dest, title=title)
+            self.finish(job, (job.url, True, f"Linked existing copy of {title}"))
+            return
+        if self.stream:
+            # piping already overlaps transfer and encode, so the job ends here
+            try:
+                dest, title = self.stream_audio_retrying(job.url, job.output_path, with_artist=job.kind == "single")
+                self.remember(dest)
+                self.record(job, TRANSCODED, dest=dest, title=title)
+                result = (job.url, True, f"Download successful for {title}")
+            except Exception as e:
+                result = (job.url, False, f"Error downloading video from {job.url}: {e}")
+            self.finish(job, result)
+            return
+        try:
+            source, dest, title, codec = self.fetch_audio_retrying(job.url, job.output_path, job.kind == "single", job.source,
+                                                                   lambda path: self.claim_source(job, path))
+        except Exception as e:
+            self.finish(job, (job.url, False, f"Error downloading video from {job.url}: {e}"))
+            return
+        self.record(job, FETCHED, source=source, dest=dest, title=title, codec=codec)
+        # blocks while the transcoders are behind, timed so transcode workers can be sized from it
+        with self.metrics.timer("queue_wait"):
+            self.fetched.put((job, source, dest, title, codec))
+
+    def claim_source(self, job: TrackJob, source: str) -> None:
+        job.source = source
+        self.record(job, PENDING, source=source)
+
+    def transcode(self) -> None:
+        while True:
+            entry = self.fetched.get()
+            if entry is None:
+                return
+            job, source, dest, title, codec = entry
+            if self.cancelled:
+                # the fetched source stays on disk for the next run
+                self.finish(job, (job.url, False, "Cancelled"))
+                continue
+            try:
+                self.ffmpeg_extract_audio(source, dest, codec, track=job.url)
+                discard(source)
+                self.remember(dest)
+                self.record(job, TRANSCODED)
+                result = (job.url, True, f"Download successful for {title}")
+            except Exception as e:
+                result = (job.url, False, f"Error converting video from {job.url}: {e}")
+            self.finish(job, result)
+
+    def start(self) -> None:
+        """ bring up the worker pools and the browser pool, they stay warm across runs until close() """
+        if self.started:
+            return
+        self.downloader: Downloader = Downloader(cache=self.cache)
+        self.browser_pool: BrowserPool = BrowserPool()
+        self.downloader.browser_pool = self.browser_pool
+        self.fetchers: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=self.fetch_workers)
+        self.transcoders: list = [threading.Thread(target=self.transcode, daemon=True) for _ in range(self.transcode_workers)]
+        for thread in self.transcoders:
+            thread.start()
+        self.started = True
+
+    def close(self) -> None:
+        if not self.started:
+            return
+        self.started = False
+        self.fetchers.shutdown(wait=True)
+        for _ in self.transcoders:
+            self.fetched.put(None)
+        for thread in self.transcoders:
+            thread.join()
+        self.browser_pool.close()
+
+    def cancel(self) -> None:
+        """ stop queueing new work, tracks already transferring or encoding still finish, it holds until the owner
+            clears ``cancelled`` for its next job so a cancel that lands before run() is not lost """
+        self.cancelled = True
+
+    def add(self, items: list, path: str, profile: OutputProfile) -> bool:
+        """ hand more items to the run in progress so they share its pools instead of waiting for it to end,
+            False when no run is taking items for that library and profile """
+        with self.idle:
+            if not self.running or self.cancelled or path != self.path or profile != self.profile:
+                return False
+            if self.journal is not None:
+                self.journal.add_items(items, self.path)
+            self.incoming.extend(items)
+            self.idle.notify_all()
+        return True
+
+    def queue_item(self, item: dict) -> None:
+        try:
+            jobs = self.expand(item, self.downloader)
+        except Exception as e:
+            logging.exception(f"Could not queue {item.get('id')}: {e}")
+            jobs = []
+            with self.lock:
+                self.report.add(item_url(item), self.path, (item_url(item), False, f"Could not queue {item['id']}: {e}"),
+                                item['id'])
+        with self.lock:
+            self.total += len(jobs)
+            if jobs:
+                self.outstanding[item['id']] = self.outstanding.get(item['id'], 0) + len(jobs)
+            elif self.on_item_done is not None:
+                self.on_item_done(item['id'])
+        if self.progress is not None:
+            self.progress.expect(self.total)
+        for job, row in jobs:
+            self.submit(job, row)
+
+    def drain(self) -> None:
+        """ expand items as they come in until none are left and every queued track has finished """
+        while True:
+            with self.idle:
+                self.idle.wait_for(lambda: self.incoming or self.done >= self.total)
+                if self.cancelled:
+                    self.incoming.clear()
+                if not self.incoming:
+                    return
+                item = self.incoming.popleft()
+            self.queue_item(item)
+
+    def run(self, items: list) -> list:
+        warm: bool = self.started
+        self.start()
+        with self.lock:
+            self.total = 0
+            self.done = 0
+            self.report = JobReport()
+            self.failed = []
+            self.manifests = {}
+            self.claimed = {}
+            self.outstanding = {}
+            self.incoming = deque(items)
+            self.ready = {}
+        if self.progress is not None:
+            self.progress.reset()
+        # a fresh registry per run so each job's numbers can be dumped on their own
+        self.metrics = Metrics()
+        self.downloader.metrics = self.metrics
+        started: float = time.perf_counter()
+        self.create_directory(f"{self.path}/")
+        # singles land in the root, album folders are swept as their playlists are expanded
+        self.metrics.add('swept', sweep_orphans(self.path, recursive=False))
+        self.index = FileIndex.for_library(self.path)
+        if self.journal is not None:
+            self.journal.add_items(items, self.path)
+        with self.lock:
+            self.running = True
+        try:
+            while True:
+                self.drain()
+                self.retry_failed()
+                with self.lock:
+                    # items that arrived during the retry rounds still belong to this run
+                    if not self.incoming or self.cancelled:
+                        self.running = False
+                        break
+        finally:
+            with self.lock:
+                self.running = False
+                self.incoming.clear()
+            self.metrics.observe("job", time.perf_counter() - started)
+            if not warm:
+                self.close()
+            self.save_manifests()
+            self.index.close()
+            self.index = None
+            if self.journal is not None:
+                self.journal.close_items(self.path)
+        return self.report.results
+
+    def save_manifests(self) -> None:
+        """ record what each synced playlist now has on disk, cancelled or failed tracks stay new for next time """
+        for item_id, (manifest, album_path) in self.manifests.items():
+            urls = [entry['url'] for entry in self.report.tracks.values() if entry['item'] == item_id and entry['ok']]
+            try:
+                self.record_sync(manifest, urls, album_path)
+            except Exception as e:
+                logging.exception(f"Could not save the manifest of {item_id}: {e}")
+
+    def retry_failed(self) -> None:
+        """ queue only the tracks that failed again, a round at a time, until they pass or the rounds run out """
+        for _ in range(self.retries):
+            with self.lock:
+                jobs, self.failed = self.failed, []
+                if not jobs or self.cancelled:
+                    return
+                # the retried tracks count as outstanding again
+                self.done -= len(jobs)
+                self.report.retried += len(jobs)
+                for job in jobs:
+                    self.outstanding[job.item_id] = self.outstanding.get(job.item_id, 0) + 1
+            self.metrics.add('retries', len(jobs), reason="track")
+            for job in jobs:
+                self.submit(job, None)
+            with self.idle:
+                self.idle.wait_for(lambda: self.done >= self.total)
+
+    def submit(self, job: TrackJob, row) -> None:
+        """ send a job to the stage its journal row left off at """
+        state = row['state'] if row is not None else PENDING
+        if row is not None and row['source']:
+            job.source = row['source']
+        if state in (TRANSCODED, DONE) and row['dest'] and os.path.exists(row['dest']):
+            self.finish(job, (job.url, True, f"Already downloaded {row['title']}"))
+        elif state == FETCHED and row['source'] and os.path.exists(row['source']):
+            if self.progress is not None:
+                self.progress.begin(job.url, row['title'])
+            self.fetched.put((job, row['source'], row['dest'], row['title'], row['codec']))
+        else:
+            with self.lock:
+                if job.video_id in self.claimed:
+                    self.claimed[job.video_id].append(job)
+                    return
+                self.claimed[job.video_id] = []
+            self.dispatch(job)
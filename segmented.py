@@ -0,0 +1,214 @@
+import os
+import json
+import math
+import asyncio
+import logging
+import threading
+from netcore import (
+    NetCore,
+    shared,
+    timeout_for)
+
+CHUNK_SIZE = 256 * 1024
+MIN_SEGMENT_SIZE = 1024 * 1024
+STATE_EVERY = 4 * 1024 * 1024
+
+
+class RangeNotSupported(IOError):
+    pass
+
+
+class SegmentedDownload:
+    """ fetch one url over several http range requests into ``path`` and resume a previous partial run,
+    the requests run as tasks on the shared network loop rather than a thread each, and everything that
+    touches the disk or calls back into the caller runs on the core's shared writer threads """
+    def __init__(self, url: str, path: str, connections: int = 4, size: int | None = None,
+                 core: NetCore | None = None, timeout: int = 30, on_progress=None) -> None:
+        self.url: str = url
+        self.path: str = path
+        self.part: str = f"{path}.part"
+        self.state_path: str = f"{path}.part.json"
+        self.connections: int = max(connections, 1)
+        self.size: int | None = size
+        self.core: NetCore = core or shared()
+        self.timeout: int = timeout
+        self.segments: list = []
+        self.unsaved: int = 0
+        # called with the total bytes on disk so far, the first call carries any resumed offset
+        self.on_progress = on_progress
+        self.fallbacks: int = 0
+        # bytes actually transferred by this run, resumed bytes excluded
+        self.received: int = 0
+        # writer threads finish out of order, progress only ever moves forward
+        self.notified: int = -1
+        self.notify_lock: threading.Lock = threading.Lock()
+        self.saving: asyncio.Lock | None = None
+
+    def notify(self, written: int) -> None:
+        if self.on_progress is None:
+            return
+        with self.notify_lock:
+            if written <= self.notified:
+                return
+            self.notified = written
+            self.on_progress(written)
+
+    def report(self, written: int) -> None:
+        # sent after the writes it counts have landed, so the caller never hears about bytes not on disk
+        if self.on_progress is not None:
+            self.core.writer.submit(self.notify, written)
+
+    async def checkpoint(self) -> None:
+        # one save at a time per download, each snapshot newer than the one before it
+        async with self.saving:
+            await self.core.write(self.save_state, self.snapshot())
+
+    async def probe(self) -> tuple:
+        """ total size and whether the server answers range requests """
+        headers = {'Range': 'bytes=0-0'}
+        async with self.core.media.stream("GET", self.url, headers=headers, timeout=timeout_for(self.timeout)) as response:
+            response.raise_for_status()
+            if response.status_code == 206 and '/' in response.headers.get('Content-Range', ''):
+                total = response.headers['Content-Range'].rsplit('/', 1)[1]
+                if total.isdigit():
+                    return int(total), True
+            length = response.headers.get('Content-Length')
+            return (int(length) if length and length.isdigit() else None), False
+
+    def plan(self, size: int) -> list:
+        count = max(1, min(self.connections, math.ceil(size / MIN_SEGMENT_SIZE)))
+        step = math.ceil(size / count)
+        # [start, end inclusive, bytes already written]
+        return [[start, min(start + step, size) - 1, 0] for start in range(0, size, step)]
+
+    def load_state(self, size: int) -> list | None:
+        if not (os.path.exists(self.part) and os.path.exists(self.state_path)):
+            return None
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # stream urls are signed and change between runs, so match on size only
+        if state.get('size') != size or os.path.getsize(self.part) != size:
+            return None
+        return state['segments']
+
+    def save_state(self, segments: list | None = None) -> None:
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'size': self.size, 'segments': self.segments if segments is None else segments}, f)
+        os.replace(tmp, self.state_path)
+
+    def snapshot(self) -> list:
+        return [list(segment) for segment in self.segments]
+
+    def create_part(self, size: int) -> None:
+        with open(self.part, 'wb') as f:
+            f.truncate(size)
+
+    @staticmethod
+    def write_at(f, offset: int, chunk: bytes) -> None:
+        f.seek(offset)
+        f.write(chunk)
+
+    @property
+    def written(self) -> int:
+        return sum(segment[2] for segment in self.segments)
+
+    async def fetch_segment(self, segment: list) -> None:
+        start, end, _ = segment
+        offset = start + segment[2]
+        if offset > end:
+            return
+        headers = {'Range': f"bytes={offset}-{end}"}
+        async with self.core.media.stream("GET", self.url, headers=headers, timeout=timeout_for(self.timeout)) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RangeNotSupported(f"Server ignored range request for {self.url}")
+            # a handle per segment, so writes from different writer threads never share a file position
+            f = await self.core.write(open, self.part, 'r+b')
+            try:
+                # segments share the loop thread, so the bookkeeping below needs no lock
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    chunk = chunk[:end + 1 - offset]
+                    if not chunk:
+                        break
+                    # awaited so a slow disk holds back the socket instead of piling chunks up in memory
+                    await self.core.write(self.write_at, f, offset, chunk)
+                    offset += len(chunk)
+                    segment[2] += len(chunk)
+                    self.unsaved += len(chunk)
+                    self.received += len(chunk)
+                    if self.unsaved >= STATE_EVERY:
+                        self.unsaved = 0
+                        await self.checkpoint()
+                    self.report(self.written)
+            finally:
+                await asyncio.shield(self.core.write(f.close))
+        if offset <= end:
+            raise IOError(f"Connection closed {end + 1 - offset} bytes early for {self.url}")
+
+    async def fetch_whole(self) -> None:
+        async with self.core.media.stream("GET", self.url, timeout=timeout_for(self.timeout)) as response:
+            response.raise_for_status()
+            received = 0
+            # a restart from zero, so progress may go back this once
+            self.notified = -1
+            await self.core.write(self.notify, received)
+            f = await self.core.write(open, self.part, 'wb')
+            try:
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    await self.core.write(f.write, chunk)
+                    received += len(chunk)
+                    self.received += len(chunk)
+                    self.report(received)
+            finally:
+                await asyncio.shield(self.core.write(f.close))
+
+    def finalize(self) -> str:
+        os.replace(self.part, self.path)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        return self.path
+
+    def run(self) -> str:
+        return self.core.run(self.download())
+
+    async def fetch_segments(self) -> None:
+        tasks = [asyncio.ensure_future(self.fetch_segment(segment)) for segment in self.segments]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # stop the other ranges before the state is saved or a retry reopens the file
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def download(self) -> str:
+        self.saving = asyncio.Lock()
+        ranges = True
+        if self.size is None:
+            self.size, ranges = await self.probe()
+        if not ranges or not self.size:
+            await self.fetch_whole()
+            return await self.core.write(self.finalize)
+        segments = await self.core.write(self.load_state, self.size)
+        if segments is None:
+            await self.core.write(self.create_part, self.size)
+        self.segments = segments if segments is not None else self.plan(self.size)
+        await self.checkpoint()
+        # awaited, the resumed offset is always the first thing the caller hears
+        await self.core.write(self.notify, self.written)
+        try:
+            await self.fetch_segments()
+        except RangeNotSupported:
+            logging.error(f"Falling back to a single connection for {self.url}")
+            self.fallbacks += 1
+            await self.fetch_whole()
+            return await self.core.write(self.finalize)
+        finally:
+            if os.path.exists(self.part):
+                await self.checkpoint()
+        return await self.core.write(self.finalize)
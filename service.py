@@ -0,0 +1,330 @@
+import sys
+import json
+import time
+import uuid
+import queue
+import logging
+import argparse
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer)
+from scheduler import (
+    Scheduler,
+    DEFAULT_FETCH_WORKERS,
+    DEFAULT_TRANSCODE_WORKERS)
+from resolver import parse_items
+from profiles import get_profile
+from journal import Journal
+from progress import ProgressTracker
+from metrics import Metrics
+from tempfiles import sweep_orphans
+from cache import MetadataCache
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+CANCELLED = "cancelled"
+FAILED = "failed"
+# events a job keeps, older ones are dropped, progress snapshots make up most of them
+MAX_EVENTS = 1000
+# finished jobs stay listed this many seconds, and only the most recent MAX_FINISHED of them
+RETENTION = 60 * 60
+MAX_FINISHED = 100
+
+
+class Job:
+    def __init__(self, items: list, output: str, profile: str = "mp3", bitrate: int = 0, sync: bool = False,
+                 prune: bool = False) -> None:
+        self.id: str = uuid.uuid4().hex[:12]
+        self.items: list = items
+        self.output: str = output
+        self.profile: str = profile
+        self.bitrate: int = bitrate
+        self.sync: bool = sync or prune
+        self.prune: bool = prune
+        self.state: str = QUEUED
+        self.created: float = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.total: int = 0
+        self.done: int = 0
+        self.failed: int = 0
+        self.events: deque = deque(maxlen=MAX_EVENTS)
+        # every event ever emitted, so a reader can tell how many it missed once the oldest fell off
+        self.emitted: int = 0
+        self.metrics: Metrics | None = None
+        self.report: dict | None = None
+        self.changed: threading.Condition = threading.Condition()
+
+    @property
+    def over(self) -> bool:
+        return self.state in (FINISHED, CANCELLED, FAILED)
+
+    def emit(self, event: str, **fields) -> None:
+        with self.changed:
+            self.events.append({'event': event, 'job': self.id, 'time': round(time.time(), 3), **fields})
+            self.emitted += 1
+            self.changed.notify_all()
+
+    def events_since(self, seen: int) -> tuple:
+        """ events after the first ``seen`` that are still kept, and the count to pass next time """
+        with self.changed:
+            missed = min(self.emitted - seen, len(self.events))
+            return list(self.events)[len(self.events) - missed:], self.emitted
+
+    def track_done(self, job, result: tuple, done: int, total: int) -> None:
+        self.done, self.total = done, total
+        if not result[1]:
+            self.failed += 1
+        self.emit("track", id=job.video_id, item=job.item_id, ok=result[1], message=result[2], done=done, total=total)
+
+    def transfer(self, snapshot: dict) -> None:
+        self.emit("progress", **snapshot)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id, 'state': self.state, 'output': self.output, 'items': len(self.items),
+            'created': self.created, 'started': self.started, 'finished': self.finished,
+            'total': self.total, 'done': self.done, 'failed': self.failed,
+        }
+
+
+class JobService:
+    """ run submitted jobs one after another on a single warm scheduler """
+    def __init__(self, fetch_workers: int = DEFAULT_FETCH_WORKERS, transcode_workers: int = DEFAULT_TRANSCODE_WORKERS,
+                 connections: int = 4, stream: bool = False) -> None:
+        self.cache: MetadataCache = MetadataCache()
+        self.scheduler: Scheduler = Scheduler("", fetch_workers=fetch_workers, transcode_workers=transcode_workers,
+                                              stream=stream, connections=connections, cache=self.cache)
+        self.jobs: dict = {}
+        # every finished job is folded in here for the prometheus endpoint
+        self.metrics: Metrics = Metrics()
+        self.pending: queue.Queue = queue.Queue()
+        self.current: Job | None = None
+        # libraries already checked for orphaned temp files since the service started
+        self.swept: set = set()
+        self.lock: threading.Lock = threading.Lock()
+        self.worker: threading.Thread = threading.Thread(target=self.work, daemon=True)
+        self.worker.start()
+
+    def submit(self, items: list, output: str, profile: str = "mp3", bitrate: int = 0, sync: bool = False,
+               prune: bool = False) -> Job:
+        get_profile(profile, bitrate)
+        job = Job(items, output, profile, bitrate, sync, prune)
+        with self.lock:
+            self.evict()
+            self.jobs[job.id] = job
+        job.emit("queued", items=len(items))
+        self.pending.put(job)
+        return job
+
+    def cancel(self, job_id: str) -> Job | None:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.over:
+                return job
+            if job is self.current:
+                self.scheduler.cancel()
+            else:
+                job.state = CANCELLED
+                job.finished = time.time()
+        job.emit("cancelled")
+        return job
+
+    def evict(self, now: float | None = None) -> None:
+        """ forget finished jobs past the retention period or beyond the most recent MAX_FINISHED, lock held """
+        now = now or time.time()
+        over = sorted((job for job in self.jobs.values() if job.over), key=lambda job: job.finished or job.created)
+        for index, job in enumerate(over):
+            if index < len(over) - MAX_FINISHED or (job.finished or job.created) < now - RETENTION:
+                del self.jobs[job.id]
+
+    def work(self) -> None:
+        # the browser pool is bound to this thread, so every run and the final close happen here
+        while True:
+            job = self.pending.get()
+            if job is None:
+                self.scheduler.close()
+                return
+            with self.lock:
+                if job.state == CANCELLED:
+                    continue
+                # cleared before the job becomes current, from here on a cancel sticks through the sweep and run()
+                self.scheduler.cancelled = False
+                self.current = job
+                job.state = RUNNING
+                job.started = time.time()
+            job.emit("started")
+            if job.output not in self.swept:
+                self.swept.add(job.output)
+                job.emit("swept", removed=sweep_orphans(job.output))
+            journal: Journal = Journal.for_library(job.output)
+            self.scheduler.path = job.output
+            self.scheduler.profile = get_profile(job.profile, job.bitrate)
+            self.scheduler.journal = journal
+            self.scheduler.on_job_done = job.track_done
+            self.scheduler.sync, self.scheduler.prune = job.sync, job.prune
+            self.scheduler.progress = ProgressTracker(job.transfer, interval=1.0)
+            try:
+                self.scheduler.start()
+                self.scheduler.run(job.items)
+                state = CANCELLED if self.scheduler.cancelled else FINISHED
+            except Exception as e:
+                logging.exception(f"Job {job.id} failed: {e}")
+                state = FAILED
+            finally:
+                journal.close()
+            job.metrics = self.scheduler.metrics
+            self.metrics.merge(job.metrics)
+            job.report = self.scheduler.report.to_dict()
+            # the live count includes attempts a retry round later fixed
+            job.failed = job.report['failed']
+            with self.lock:
+                self.current = None
+                job.state = state
+                job.finished = time.time()
+                self.evict()
+            job.emit(state, done=job.done, failed=job.failed, total=job.total, failures=job.report['failures'])
+
+    def stats(self) -> dict:
+        return {
+            'cache': self.cache.stats(),
+            'browser_launches_avoided': self.scheduler.browser_pool.launches_avoided if self.scheduler.started else 0,
+            'queued': self.pending.qsize(),
+            'concurrency': self.scheduler.limiter.stats(),
+        }
+
+    def close(self) -> None:
+        if self.current is not None:
+            self.scheduler.cancel()
+        self.pending.put(None)
+        self.worker.join()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service: JobService = None
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def send_json(self, status: int, body) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_text(self, status: int, text: str) -> None:
+        data = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def route(self) -> list:
+        return [part for part in urlparse(self.path).path.split('/') if part]
+
+    def job(self, job_id: str) -> Job | None:
+        with self.service.lock:
+            return self.service.jobs.get(job_id)
+
+    def do_GET(self) -> None:
+        route = self.route()
+        if route == ['jobs']:
+            with self.service.lock:
+                jobs = [job.to_dict() for job in self.service.jobs.values()]
+            return self.send_json(200, jobs)
+        if route == ['stats']:
+            return self.send_json(200, self.service.stats())
+        if route == ['metrics']:
+            return self.send_text(200, self.service.metrics.prometheus())
+        if len(route) in (2, 3) and route[0] == 'jobs':
+            job = self.job(route[1])
+            if job is None:
+                return self.send_json(404, {'error': 'no such job'})
+            if len(route) == 2:
+                return self.send_json(200, dict(job.to_dict(), events=job.events_since(0)[0]))
+            if route[2] == 'events':
+                return self.stream_events(job)
+            if route[2] == 'metrics':
+                return self.send_json(200, job.metrics.to_dict() if job.metrics is not None else {})
+            if route[2] == 'report':
+                return self.send_json(200, job.report or {})
+        self.send_json(404, {'error': 'not found'})
+
+    def stream_events(self, job: Job) -> None:
+        """ newline delimited json, one event per line, until the job is over """
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        sent = 0
+        while True:
+            with job.changed:
+                job.changed.wait_for(lambda: job.emitted > sent or job.over, timeout=15)
+                over = job.over
+            # a reader that fell behind skips the events the job no longer keeps
+            events, sent = job.events_since(sent)
+            try:
+                for event in events:
+                    self.wfile.write(json.dumps(event).encode() + b"\n")
+                self.wfile.flush()
+            except OSError:
+                return
+            if over and sent == job.emitted:
+                return
+
+    def do_POST(self) -> None:
+        if self.route() != ['jobs']:
+            return self.send_json(404, {'error': 'not found'})
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+            items, invalid = parse_items("\n".join(body.get('items', [])))
+            if not items or not body.get('output'):
+                raise ValueError("items and output are required")
+            job = self.service.submit(items, body['output'], body.get('profile', 'mp3'), int(body.get('bitrate', 0)),
+                                      bool(body.get('sync')), bool(body.get('prune')))
+        except (ValueError, TypeError, AttributeError) as e:
+            return self.send_json(400, {'error': str(e)})
+        self.send_json(201, dict(job.to_dict(), invalid=invalid))
+
+    def do_DELETE(self) -> None:
+        route = self.route()
+        if len(route) != 2 or route[0] != 'jobs':
+            return self.send_json(404, {'error': 'not found'})
+        job = self.service.cancel(route[1])
+        if job is None:
+            return self.send_json(404, {'error': 'no such job'})
+        self.send_json(200, job.to_dict())
+
+
+def main(argv: list | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="ytmusic-dl-service", description="Run the downloader as a local HTTP job service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS)
+    parser.add_argument("--transcode-workers", type=int, default=DEFAULT_TRANSCODE_WORKERS)
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--stream", action="store_true")
+    args = parser.parse_args(argv)
+    logging.basicConfig(filename='error.log', level=logging.ERROR)
+    ServiceHandler.service = JobService(args.fetch_workers, args.transcode_workers, args.connections, args.stream)
+    server = ThreadingHTTPServer((args.host, args.port), ServiceHandler)
+    server.daemon_threads = True
+    print(json.dumps({'event': 'listening', 'host': args.host, 'port': server.server_port}), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        ServiceHandler.service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
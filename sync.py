@@ -0,0 +1,75 @@
+import os
+import json
+import time
+import logging
+import contextlib
+from journal import state_path
+
+# a sync that would drop more than this share of a playlist is more likely a bad listing than a real edit
+MAX_PRUNE_SHARE = 0.5
+
+
+class Manifest:
+    """ a playlist's tracks as of its last sync and the file each became, so the next sync only fetches what is new """
+    def __init__(self, path: str, playlist_id: str) -> None:
+        self.path: str = path
+        self.playlist_id: str = playlist_id
+        self.synced: float | None = None
+        # video id -> output file, in playlist order
+        self.tracks: dict = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+                self.synced = data.get('synced')
+                self.tracks = data.get('tracks', {})
+            except (OSError, ValueError) as e:
+                # a broken manifest only costs a full pass, the file index still skips what is on disk
+                logging.exception(f"Ignoring unreadable manifest {path}: {e}")
+
+    @classmethod
+    def for_playlist(cls, root: str, playlist_id: str) -> "Manifest":
+        return cls(state_path(root, f"manifest-{playlist_id}.json"), playlist_id)
+
+    def present(self, video_id: str) -> bool:
+        dest = self.tracks.get(video_id)
+        return dest is not None and os.path.exists(dest)
+
+    def diff(self, video_ids: list) -> tuple:
+        """ ids that still need fetching and ids the playlist no longer has """
+        current = set(video_ids)
+        new = [video_id for video_id in video_ids if not self.present(video_id)]
+        removed = [video_id for video_id in self.tracks if video_id not in current]
+        return new, removed
+
+    def unsafe_prune(self, video_ids: list, removed: list, complete: bool = True) -> str | None:
+        """ why deleting ``removed`` on this listing could destroy tracks that are still there, None when it is safe """
+        if not video_ids:
+            return "the playlist listing came back empty"
+        if not complete:
+            return "the playlist listing is incomplete"
+        if self.tracks and len(removed) > len(self.tracks) * MAX_PRUNE_SHARE:
+            return f"{len(removed)} of {len(self.tracks)} synced tracks would be removed"
+        return None
+
+    def add(self, video_id: str, dest: str) -> None:
+        self.tracks[video_id] = dest
+
+    def prune(self, video_ids: list) -> int:
+        """ delete the files of tracks that left the playlist, returns how many were on disk """
+        removed = 0
+        for video_id in video_ids:
+            dest = self.tracks.pop(video_id, None)
+            if dest is None:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(dest)
+                removed += 1
+        return removed
+
+    def save(self) -> None:
+        self.synced = time.time()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'playlist': self.playlist_id, 'synced': self.synced, 'tracks': self.tracks}, f, indent=2)
+        os.replace(tmp, self.path)
@@ -0,0 +1,58 @@
+import os
+import time
+import uuid
+import logging
+import contextlib
+from journal import STATE_DIR
+
+# hidden, so the catalog and file browsers skip them while they are being written
+TEMP_PREFIX = ".ytdl-"
+SOURCE_PREFIX = ".ytdl-src-"
+PARTIAL_SUFFIXES = ('.part', '.part.json', '.part.json.tmp')
+# no conversion runs this long, a temp output older than this was left by a crash
+OUTPUT_MAX_AGE = 60 * 60
+# downloaded sources and partials are kept this long so a retry can resume them
+SOURCE_MAX_AGE = 7 * 24 * 60 * 60
+
+
+def source_path(directory: str, video_id: str, filename: str) -> str:
+    """ where a track's source stream is downloaded, unique per job so overlapping jobs never share one,
+    callers keep the path to resume a partial download """
+    return os.path.join(directory, f"{SOURCE_PREFIX}{video_id}-{uuid.uuid4().hex[:8]}{os.path.splitext(filename)[1]}")
+
+
+def temp_output(dest: str) -> str:
+    """ a private name next to ``dest`` on the same filesystem, keeping the extension ffmpeg picks the muxer from """
+    directory, name = os.path.split(dest)
+    return os.path.join(directory, f"{TEMP_PREFIX}{uuid.uuid4().hex[:8]}-{name}")
+
+
+def discard(path: str) -> None:
+    """ remove a task's own file and the partial download state next to it """
+    for candidate in (path,) + tuple(path + suffix for suffix in PARTIAL_SUFFIXES):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(candidate)
+
+
+def sweep_orphans(root: str, now: float | None = None, recursive: bool = True) -> int:
+    """ delete temp files left behind by crashed runs in ``root`` and, unless told otherwise, every folder
+    below it, returns how many went """
+    now = now or time.time()
+    removed = 0
+    for directory, subdirs, files in os.walk(root):
+        if STATE_DIR in subdirs:
+            subdirs.remove(STATE_DIR)
+        if not recursive:
+            subdirs.clear()
+        for name in files:
+            if not name.startswith(TEMP_PREFIX):
+                continue
+            path = os.path.join(directory, name)
+            max_age = SOURCE_MAX_AGE if name.startswith(SOURCE_PREFIX) else OUTPUT_MAX_AGE
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed += 1
+            except OSError as e:
+                logging.exception(f"Could not remove {path}: {e}")
+    return removed
@@ -0,0 +1,81 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer
+import httpx
+import pytest
+from cache import (
+    EXPIRY_MARGIN,
+    MetadataCache,
+    url_expiry)
+from downloader import Base
+from benchmark import StandInHandler
+
+
+class ExpiringHandler(StandInHandler):
+    """ the benchmark stand-in, refusing audio with 403 while ``expired`` is set like a lapsed signed url """
+    expired: bool = False
+
+    def respond(self) -> None:
+        if self.expired and self.path.startswith("/audio/"):
+            return self.send_body(403, b"expired", 'text/plain')
+        super().respond()
+
+
+class Resolver(Base):
+    """ resolves from the stand-in and counts how often it had to """
+    base: str = ""
+    resolved: int = 0
+
+    def fetch_metadata(self, video_url: str) -> dict:
+        self.resolved += 1
+        return httpx.get(f"{self.base}/meta/{self.video_id(video_url)}").json()
+
+
+@pytest.fixture
+def origin():
+    handler = type("Handler", (ExpiringHandler,), {'audio': os.urandom(64 * 1024), 'lock': threading.Lock(),
+                                                   'active': 0})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    handler.base = f"http://127.0.0.1:{server.server_port}"
+    yield handler
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def resolver(origin, tmp_path):
+    cache = MetadataCache(str(tmp_path / "metadata.sqlite3"))
+    resolver = Resolver(cache=cache)
+    resolver.base = origin.base
+    yield resolver
+    cache.close()
+
+
+def test_manifest_resolved_once(resolver, tmp_path):
+    url = "https://www.youtube.com/watch?v=abc"
+    # the title the queue stored first must not hide that the manifest is still missing
+    resolver.cache.update("abc", title="Queued title")
+    source, dest, title, codec = resolver.fetch_audio(url, str(tmp_path))
+    resolver.fetch_audio(url, str(tmp_path))
+    assert resolver.resolved == 1
+    assert title == "Track abc" and os.path.getsize(source) == 64 * 1024
+
+
+def test_refused_url_resolved_again(resolver, origin, tmp_path):
+    url = "https://www.youtube.com/watch?v=abc"
+    resolver.video_metadata(url)
+    origin.expired = True
+    with pytest.raises(httpx.HTTPStatusError):
+        resolver.fetch_audio(url, str(tmp_path))
+    assert resolver.cache.get("abc", 'streams') is None
+    assert resolver.cache.get("abc", 'title') is not None
+    origin.expired = False
+    resolver.fetch_audio(url, str(tmp_path))
+    assert resolver.resolved == 2
+
+
+def test_expiry_leaves_a_margin():
+    assert url_expiry("https://host/videoplayback?expire=1700000000&sig=x") == 1700000000 - EXPIRY_MARGIN
+    assert url_expiry("https://host/videoplayback?sig=x") is None
@@ -0,0 +1,63 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer
+import mutagen
+from mutagen.mp3 import MP3
+import pytest
+import resolver
+from catalog import read_audio_info
+from profiles import get_profile
+from benchmark import (
+    BenchScheduler,
+    StandInHandler,
+    fixture_audio,
+    playlist_id,
+    track_id)
+
+DURATION = 3
+TRACKS = 2
+
+
+@pytest.fixture
+def origin(tmp_path, monkeypatch):
+    # databases and the synthetic stream land in the test's own cache directory
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    with open(fixture_audio(DURATION), 'rb') as f:
+        audio = f.read()
+    handler = type("Handler", (StandInHandler,), {'audio': audio, 'tracks': TRACKS, 'duration': DURATION,
+                                                  'lock': threading.Lock(), 'active': 0})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    monkeypatch.setattr(resolver, "PLAYLIST_URL", f"{base}/playlist?list={{}}")
+    monkeypatch.setattr(resolver, "WATCH_URL", f"{base}/watch?v={{}}")
+    yield base
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_pipeline_converts_stand_in_audio(origin, tmp_path, stream):
+    library = tmp_path / "library"
+    library.mkdir()
+    scheduler = BenchScheduler(str(library), fetch_workers=2, transcode_workers=2, stream=stream,
+                               profile=get_profile('mp3'))
+    scheduler.base = origin
+    scheduler.log = str(tmp_path / "finished.log")
+    single = track_id(9, 0)
+    try:
+        scheduler.run([{'id': playlist_id(0), 'type': "playlist"}, {'id': single, 'type': "single"}])
+    finally:
+        scheduler.close()
+    assert scheduler.report.failures == []
+    # only the conversions are left, no source or temp file survives either mode
+    outputs = sorted(os.path.join(root, name) for root, _, names in os.walk(library) for name in names
+                     if not root.endswith(".ytmusic-dl"))
+    expected = [str(library / "Bench Artist - Album 0" / f"Track {track_id(0, track)}.mp3") for track in range(TRACKS)]
+    assert outputs == sorted(expected + [str(library / f"Bench Artist - Track {single}.mp3")])
+    for path in outputs:
+        assert isinstance(mutagen.File(path), MP3)
+        duration, bitrate = read_audio_info(path)
+        assert duration == pytest.approx(DURATION, abs=0.2)
+        assert bitrate == 320000
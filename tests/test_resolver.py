@@ -0,0 +1,108 @@
+import os
+import json
+import httpx
+import pytest
+from resolver import (
+    PlaylistResolver,
+    parse_continuation,
+    parse_item,
+    parse_playlist)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class FixtureCore:
+    """ answers the playlist page and its browse continuation from the saved fixtures """
+    def __init__(self, html: str, pages: dict, fail: set | None = None) -> None:
+        self.html: str = html
+        self.pages: dict = pages
+        self.fail: set = fail or set()
+        self.continuations: list = []
+
+    def get(self, url, headers=None, timeout=None) -> httpx.Response:
+        return httpx.Response(200, text=self.html, request=httpx.Request("GET", url))
+
+    def request(self, method, url, headers=None, content=None, timeout=None) -> httpx.Response:
+        token = json.loads(content)['continuation']
+        self.continuations.append((url, token))
+        status = 500 if token in self.fail else 200
+        return httpx.Response(status, json=self.pages.get(token, {}), request=httpx.Request(method, url))
+
+
+def test_album_tracks_and_durations():
+    playlist = parse_playlist(fixture("playlist_album.html"), "OLAK5uy_album")
+    assert [(track.id, track.duration) for track in playlist.tracks] == [
+        ("FGBhQbmPwH8", 320), ("Rh6PNQSRHRE", 212), ("yca6UsllwYs", 301), ("nsb4PztP8S0", 344)]
+    assert playlist.tracks[0].title == "One More Time"
+    assert playlist.urls[0] == "https://www.youtube.com/watch?v=FGBhQbmPwH8"
+
+
+def test_album_skips_long_and_unplayable_tracks():
+    ids = [track.id for track in parse_playlist(fixture("playlist_album.html"), "OLAK5uy_album").tracks]
+    assert "KoZs2g1qbjw" not in ids
+    assert "xxxxxxxxxxx" not in ids
+
+
+def test_album_header():
+    playlist = parse_playlist(fixture("playlist_album.html"), "OLAK5uy_album")
+    assert (playlist.title, playlist.artist) == ("Discovery", "Daft Punk")
+    assert playlist.album_name == "Daft Punk - Discovery"
+    assert playlist.complete
+
+
+def test_view_model_header():
+    playlist = parse_playlist(fixture("playlist_continued.html"), "PLcontinued")
+    assert playlist.title == "Road Trip"
+    assert playlist.album_name == "Road Trip"
+
+
+def test_first_page_keeps_continuation():
+    playlist = parse_playlist(fixture("playlist_continued.html"), "PLcontinued")
+    assert [track.id for track in playlist.tracks] == ["dQw4w9WgXcQ", "9bZkp7q19f0"]
+    assert playlist.continuation.startswith("4qmFsgKFARIk")
+    assert not playlist.complete
+
+
+def test_parse_continuation():
+    tracks, token = parse_continuation(json.loads(fixture("playlist_continued_page2.json")))
+    assert [track.id for track in tracks] == ["kJQP7kiw5Fk", "OPf0YbXqDm0"]
+    assert token == ""
+
+
+def test_unusable_page():
+    assert parse_playlist("<html><body>consent.youtube.com</body></html>", "PLnone") is None
+
+
+def test_resolver_follows_continuations():
+    html = fixture("playlist_continued.html")
+    token = parse_playlist(html, "PLcontinued").continuation
+    core = FixtureCore(html, {token: json.loads(fixture("playlist_continued_page2.json"))})
+    playlist = PlaylistResolver(core=core).resolve("PLcontinued")
+    assert [track.id for track in playlist.tracks] == ["dQw4w9WgXcQ", "9bZkp7q19f0", "kJQP7kiw5Fk", "OPf0YbXqDm0"]
+    assert playlist.complete
+    url, sent = core.continuations[0]
+    assert sent == token
+    assert "key=AIzaSyFixtureKey" in url
+
+
+def test_resolver_marks_failed_continuation_incomplete():
+    html = fixture("playlist_continued.html")
+    token = parse_playlist(html, "PLcontinued").continuation
+    playlist = PlaylistResolver(core=FixtureCore(html, {}, fail={token})).resolve("PLcontinued")
+    assert len(playlist.tracks) == 2
+    assert not playlist.complete
+
+
+@pytest.mark.parametrize("text, item", [
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=RDdQw4w9WgXcQ", {'id': "dQw4w9WgXcQ", 'type': "single"}),
+    ("https://youtu.be/dQw4w9WgXcQ", {'id': "dQw4w9WgXcQ", 'type': "single"}),
+    ("https://music.youtube.com/playlist?list=OLAK5uy_album", {'id': "OLAK5uy_album", 'type': "playlist"}),
+    ("dQw4w9WgXcQ", {'id': "dQw4w9WgXcQ", 'type': "single"}),
+])
+def test_parse_item(text, item):
+    assert parse_item(text) == item
@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+from netcore import NetCore
+from segmented import (
+    MIN_SEGMENT_SIZE,
+    SegmentedDownload)
+from benchmark import StandInHandler
+
+SIZE = 3 * MIN_SEGMENT_SIZE
+
+
+class FlakyHandler(StandInHandler):
+    """ the benchmark stand-in, optionally ignoring Range and cutting audio bodies short """
+    ranges: bool = True
+    # bytes of a body sent before the connection is dropped, only for the range starting at cut_at when set
+    cut_after: int = 0
+    cut_at: int | None = None
+    # client port of every range request, one per connection
+    ports: list = []
+
+    def respond(self) -> None:
+        if 'Range' in self.headers:
+            self.ports.append(self.client_address[1])
+        if not self.ranges and 'Range' in self.headers:
+            del self.headers['Range']
+        super().respond()
+
+    def send_body(self, status: int, body: bytes, content_type: str, headers: dict | None = None) -> None:
+        cut = self.cut_at is None or self.headers.get('Range', '').startswith(f"bytes={self.cut_at}-")
+        if status not in (200, 206) or not self.cut_after or not cut:
+            return super().send_body(status, body, content_type, headers)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body[:self.cut_after])
+        self.close_connection = True
+
+
+@pytest.fixture
+def origin():
+    handler = type("Handler", (FlakyHandler,), {'audio': os.urandom(SIZE), 'lock': threading.Lock(), 'active': 0,
+                                                'ports': []})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    handler.url = f"http://127.0.0.1:{server.server_port}/audio/track.webm"
+    yield handler
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def core():
+    core = NetCore()
+    yield core
+    core.close()
+
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_segments_assemble_the_whole_file(origin, core, tmp_path):
+    path = str(tmp_path / "track.webm")
+    download = SegmentedDownload(origin.url, path, connections=4, core=core)
+    assert download.run() == path
+    assert read(path) == origin.audio
+    assert len(download.segments) == 3
+    assert download.received == SIZE
+    assert not os.path.exists(f"{path}.part") and not os.path.exists(f"{path}.part.json")
+
+
+def test_segments_use_separate_connections(origin, core, tmp_path):
+    # slow enough that every range is still open while the others start
+    origin.bandwidth = 2 * 1024 * 1024
+    SegmentedDownload(origin.url, str(tmp_path / "track.webm"), connections=4, size=SIZE, core=core).run()
+    assert len(origin.ports) == 3
+    assert len(set(origin.ports)) == 3
+    # the api client may multiplex, stream bodies must not
+    core.start()
+    assert core.media._transport._pool._http2 is False
+
+
+def test_dropped_connection_resumes_where_it_stopped(origin, core, tmp_path):
+    path = str(tmp_path / "track.webm")
+    origin.cut_after = 300 * 1024
+    with pytest.raises(Exception):
+        SegmentedDownload(origin.url, path, connections=4, core=core).run()
+    with open(f"{path}.part.json") as f:
+        state = json.load(f)
+    assert state['size'] == SIZE
+    written = sum(segment[2] for segment in state['segments'])
+    assert 0 < written < SIZE
+    part = read(f"{path}.part")
+    for start, _, done in state['segments']:
+        assert part[start:start + done] == origin.audio[start:start + done]
+
+    origin.cut_after = 0
+    progress: list = []
+    download = SegmentedDownload(origin.url, path, connections=4, core=core, on_progress=progress.append)
+    download.run()
+    assert read(path) == origin.audio
+    assert progress[0] == written
+    assert download.received == SIZE - written
+    assert not os.path.exists(f"{path}.part.json")
+
+
+def test_falls_back_to_one_connection_without_range(origin, core, tmp_path):
+    origin.ranges = False
+    path = str(tmp_path / "track.webm")
+    download = SegmentedDownload(origin.url, path, connections=4, size=SIZE, core=core)
+    download.run()
+    assert read(path) == origin.audio
+    assert download.fallbacks == 1
+    assert not os.path.exists(f"{path}.part.json")
+
+
+def test_probe_without_range_fetches_whole(origin, core, tmp_path):
+    origin.ranges = False
+    path = str(tmp_path / "track.webm")
+    download = SegmentedDownload(origin.url, path, connections=4, core=core)
+    download.run()
+    assert read(path) == origin.audio
+    assert download.fallbacks == 0
+    assert download.segments == []
+
+
+def test_failed_segment_cancels_its_siblings(origin, core, tmp_path):
+    # the other ranges would take seconds at this rate, the first is sent straight away and cut mid-segment
+    origin.bandwidth = 256 * 1024
+    origin.cut_after = 600 * 1024
+    origin.cut_at = 0
+    path = str(tmp_path / "track.webm")
+    started = time.monotonic()
+    with pytest.raises(Exception):
+        SegmentedDownload(origin.url, path, connections=4, size=SIZE, core=core).run()
+    assert time.monotonic() - started < 2.5
+    with open(f"{path}.part.json") as f:
+        segments = json.load(f)['segments']
+    assert 0 < segments[0][2] <= 600 * 1024
+    assert all(done < end + 1 - start for start, end, done in segments[1:])
+    part = read(f"{path}.part")
+    for start, _, done in segments:
+        assert part[start:start + done] == origin.audio[start:start + done]
+
+    origin.bandwidth = 0
+    origin.cut_after = 0
+    download = SegmentedDownload(origin.url, path, connections=4, size=SIZE, core=core)
+    download.run()
+    assert read(path) == origin.audio
+    assert download.received < SIZE
@@ -0,0 +1,80 @@
+import os
+import pytest
+from downloader import Downloader
+from sync import (
+    MAX_PRUNE_SHARE,
+    Manifest)
+
+
+def url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+@pytest.fixture
+def library(tmp_path):
+    """ an album synced once with four tracks, plus a file of the user's own next to them """
+    album = tmp_path / "Album"
+    album.mkdir()
+    manifest = Manifest.for_playlist(str(tmp_path), "PLsync")
+    for video_id in ("aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc", "ddddddddddd"):
+        path = album / f"{video_id}.mp3"
+        path.write_bytes(b"audio")
+        manifest.add(video_id, str(path))
+    (album / "cover.jpg").write_bytes(b"image")
+    manifest.save()
+    return tmp_path
+
+
+def plan(library, video_ids: list, prune: bool = True, complete: bool = True) -> tuple:
+    downloader = Downloader()
+    manifest = Manifest.for_playlist(str(library), "PLsync")
+    urls = downloader.plan_sync(manifest, [url(video_id) for video_id in video_ids], str(library / "Album"),
+                                prune, complete)
+    return downloader, manifest, urls
+
+
+def test_only_new_tracks_are_fetched(library):
+    _, _, urls = plan(library, ["aaaaaaaaaaa", "bbbbbbbbbbb", "eeeeeeeeeee"], prune=False)
+    assert urls == [url("eeeeeeeeeee")]
+
+
+def test_prune_deletes_only_manifest_files(library):
+    downloader, manifest, urls = plan(library, ["aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc", "eeeeeeeeeee"])
+    assert urls == [url("eeeeeeeeeee")]
+    assert sorted(os.listdir(library / "Album")) == ["aaaaaaaaaaa.mp3", "bbbbbbbbbbb.mp3", "ccccccccccc.mp3",
+                                                     "cover.jpg"]
+    assert "ddddddddddd" not in manifest.tracks
+    assert downloader.report.synced[0]['pruned'] == 1
+    assert not downloader.report.failures
+
+
+def test_sharp_shrink_is_refused(library):
+    # three of four is past the share a real edit is trusted with
+    assert 3 > 4 * MAX_PRUNE_SHARE
+    downloader, manifest, _ = plan(library, ["aaaaaaaaaaa"])
+    assert len(os.listdir(library / "Album")) == 5
+    assert len(manifest.tracks) == 4
+    failure, = downloader.report.failures
+    assert failure['item'] == "PLsync"
+    assert "3 of 4" in failure['message']
+
+
+def test_incomplete_listing_is_refused(library):
+    downloader, _, urls = plan(library, ["aaaaaaaaaaa", "bbbbbbbbbbb", "eeeeeeeeeee"], complete=False)
+    assert urls == [url("eeeeeeeeeee")]
+    assert len(os.listdir(library / "Album")) == 5
+    assert "incomplete" in downloader.report.failures[0]['message']
+
+
+def test_empty_listing_is_refused(library):
+    downloader, _, urls = plan(library, [])
+    assert urls == []
+    assert len(os.listdir(library / "Album")) == 5
+    assert "empty" in downloader.report.failures[0]['message']
+
+
+def test_manifest_survives_a_reload(library):
+    manifest = Manifest.for_playlist(str(library), "PLsync")
+    assert manifest.present("aaaaaaaaaaa")
+    os.remove(manifest.tracks["aaaaaaaaaaa"])
+    assert manifest.diff(["aaaaaaaaaaa", "bbbbbbbbbbb"]) == (["aaaaaaaaaaa"], ["ccccccccccc", "ddddddddddd"])
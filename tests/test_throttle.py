@@ -0,0 +1,33 @@
+import time
+from throttle import (
+    MAX_RETRY_AFTER,
+    ConcurrencyController,
+    backoff)
+
+
+def test_one_burst_halves_once():
+    controller = ConcurrencyController(10, maximum=10)
+    started = time.monotonic()
+    for _ in range(10):
+        controller.throttled(started)
+    assert controller.limit == 5
+    assert controller.throttles == 10
+
+
+def test_throttle_after_the_cut_halves_again():
+    controller = ConcurrencyController(10, maximum=10)
+    controller.throttled(time.monotonic())
+    controller.throttled(time.monotonic())
+    assert controller.limit == 2.5
+
+
+def test_untimed_throttles_halve_once_per_window():
+    controller = ConcurrencyController(8, maximum=8, window=60)
+    controller.throttled()
+    controller.throttled()
+    assert controller.limit == 4
+
+
+def test_retry_after_is_capped():
+    assert backoff(0, 86400) == MAX_RETRY_AFTER
+    assert backoff(0, 3) >= 3
@@ -0,0 +1,117 @@
+import time
+import random
+import threading
+import contextlib
+import httpx
+
+# statuses an origin uses to say slow down
+THROTTLE_CODES = {429, 503}
+MAX_ATTEMPTS = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+# longest Retry-After honoured, a broken or hostile origin asking for a day would otherwise park a fetcher that long
+MAX_RETRY_AFTER = 300.0
+# seconds of completed transfers compared against the previous window before the limit moves
+WINDOW = 5.0
+# throughput has to grow by this share before another slot is opened
+GAIN = 0.05
+# per byte latency this far above the best seen means the link is queueing
+LATENCY_TOLERANCE = 2.0
+
+
+def status_of(error: Exception) -> int | None:
+    """ http status behind an httpx or urllib error, None for anything else """
+    response = getattr(error, 'response', None)
+    if response is not None and getattr(response, 'status_code', None):
+        return response.status_code
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_throttled(error: Exception) -> bool:
+    return status_of(error) in THROTTLE_CODES or isinstance(error, (httpx.TimeoutException, httpx.NetworkError,
+                                                                     httpx.RemoteProtocolError))
+
+
+def retry_after(error: Exception) -> float | None:
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or getattr(error, 'headers', None) or {}
+    value = headers.get('Retry-After')
+    return float(value) if value and value.isdigit() else None
+
+
+def backoff(attempt: int, at_least: float | None = None) -> float:
+    """ full jitter exponential backoff, never shorter than what the origin asked for up to MAX_RETRY_AFTER """
+    return max(random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt)), min(at_least or 0, MAX_RETRY_AFTER))
+
+
+class ConcurrencyController:
+    """ aimd limit on concurrent fetches, one more slot while throughput rises and half as many when throttled,
+    a slot covers one whole guarded step such as a track's transfer rather than a single request """
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 10, window: float = WINDOW) -> None:
+        self.minimum: int = minimum
+        self.maximum: int = max(maximum, minimum)
+        self.limit: float = float(min(max(initial, minimum), self.maximum))
+        self.window: float = window
+        self.active: int = 0
+        self.throttles: int = 0
+        # monotonic time of the last halving, throttles from attempts already running then were part of that burst
+        self.last_cut: float = float('-inf')
+        self.cond: threading.Condition = threading.Condition()
+        self.window_start: float = time.monotonic()
+        self.window_bytes: int = 0
+        self.window_seconds: float = 0.0
+        self.throughput: float = 0.0
+        # seconds per byte of the best window so far, a later window far above it is queueing somewhere
+        self.best_latency: float | None = None
+
+    @contextlib.contextmanager
+    def slot(self):
+        with self.cond:
+            self.cond.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.active -= 1
+                self.cond.notify()
+
+    def success(self, size: int, seconds: float) -> None:
+        now = time.monotonic()
+        with self.cond:
+            self.window_bytes += size
+            self.window_seconds += seconds
+            if now - self.window_start < self.window:
+                return
+            throughput = self.window_bytes / (now - self.window_start)
+            congested = False
+            if self.window_bytes:
+                latency = self.window_seconds / self.window_bytes
+                congested = self.best_latency is not None and latency > LATENCY_TOLERANCE * self.best_latency
+                self.best_latency = latency if self.best_latency is None else min(self.best_latency, latency)
+            if congested:
+                self.limit = max(float(self.minimum), self.limit - 1)
+            elif throughput > self.throughput * (1 + GAIN):
+                self.limit = min(float(self.maximum), self.limit + 1)
+            self.throughput = throughput
+            self.window_start, self.window_bytes, self.window_seconds = now, 0, 0.0
+            self.cond.notify_all()
+
+    def throttled(self, started: float | None = None) -> None:
+        """ one halving per burst, ``started`` is when the throttled attempt began, without it a window apart """
+        now = time.monotonic()
+        with self.cond:
+            self.throttles += 1
+            if (now - self.last_cut < self.window) if started is None else (started <= self.last_cut):
+                return
+            self.last_cut = now
+            self.limit = max(float(self.minimum), self.limit / 2)
+            # start measuring again from the reduced rate so recovery is rewarded
+            self.throughput = 0.0
+            self.window_start, self.window_bytes, self.window_seconds = time.monotonic(), 0, 0.0
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {'limit': int(self.limit), 'active': self.active, 'throttles': self.throttles,
+                    'throughput': round(self.throughput)}